@@ -0,0 +1,231 @@
+"""
+Benchmark suite for the monitoring scripts, run offline against recorded
+Datasette responses (see scripts/_replay.py).
+
+Record the fixtures once (needs the live Datasette service):
+
+    python benchmark.py --record
+
+Then time every script in scripts/ against them, at 1x and synthetic 10x:
+
+    python benchmark.py
+    python benchmark.py --scales 1 10 --repeat 3 --scripts generate_odp_status_csv.py
+
+Scripts run through run.py's task runner (one at a time by default, in
+dependency order), each suite in a fresh output and snapshot directory so
+caches kept between daily runs (table snapshots, runaway state, probe cache)
+do not skew the timings. The telemetry of every script (wall and CPU time,
+peak RSS, HTTP requests and bytes, rows written) is appended as JSON lines to
+benchmark_results/benchmark_<timestamp>.jsonl and summarised in a table.
+"""
+
+import os
+import sys
+import json
+import uuid
+import argparse
+import datetime
+import tempfile
+import statistics
+import run
+
+DEFAULT_FIXTURE_DIR = os.path.join(run.ROOT_DIR, "fixtures")
+DEFAULT_RESULTS_DIR = os.path.join(run.ROOT_DIR, "benchmark_results")
+DEFAULT_SCALES = [1, 10]
+
+# Read by scripts/_replay.py when _datasette.py is imported
+REPLAY_ENV = "DATASETTE_REPLAY"
+SCALE_ENV = "DATASETTE_REPLAY_SCALE"
+
+
+def select_scripts(names: list[str] | None) -> list[str]:
+    """
+    Returns the scripts to benchmark: all of them, or the named ones plus
+    the scripts they depend on.
+    """
+    py_files = sorted(f for f in os.listdir(run.SCRIPTS_DIR) if f.endswith(".py") and not f.startswith("_"))
+    if not names:
+        return py_files
+
+    unknown = sorted(set(names) - set(py_files))
+    if unknown:
+        raise ValueError(f"Unknown script(s): {', '.join(unknown)}")
+    selected, pending = set(), list(names)
+    while pending:
+        name = pending.pop()
+        if name in selected:
+            continue
+        selected.add(name)
+        depends_on = run.read_script_config(os.path.join(run.SCRIPTS_DIR, name))["depends_on"]
+        pending.extend(d for d in depends_on if d in py_files)
+    return [f for f in py_files if f in selected]
+
+
+def run_suite(py_files: list[str], env: dict, max_workers: int) -> list[dict]:
+    """
+    Runs the scripts once with the given extra environment, in a scratch
+    output and snapshot directory.
+
+    Returns:
+        list: The telemetry record of every task (see run.with_telemetry).
+    """
+    saved = {k: os.environ.get(k) for k in env}
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as tmp_dir:
+        output_dir = os.path.join(tmp_dir, "outputs")
+        telemetry_dir = os.path.join(tmp_dir, "telemetry")
+        os.makedirs(output_dir)
+        os.makedirs(telemetry_dir)
+        env = {
+            **env,
+            "DATASETTE_SNAPSHOT_DIR": os.path.join(tmp_dir, "snapshots"),
+            "DATASETTE_RUN_ID": uuid.uuid4().hex,
+            "MONITORING_OUTPUT_FORMAT": "csv",
+        }
+        saved.update({k: os.environ.get(k) for k in env if k not in saved})
+        os.environ.update(env)
+        # Keep benchmark runs out of the workflow's own telemetry log
+        run.TELEMETRY_FILE = os.path.join(tmp_dir, "telemetry.jsonl")
+        run._telemetry_records.clear()
+        try:
+            run.run_tasks(
+                run.build_tasks(py_files, output_dir, output_format="csv", telemetry_dir=telemetry_dir),
+                max_workers,
+            )
+        finally:
+            for k, v in saved.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+    return list(run._telemetry_records)
+
+
+def summarise(records: list[dict]) -> str:
+    """
+    Formats the benchmark results: one line per task and scale, with the
+    median wall and CPU time over the repeats.
+    """
+    groups = {}
+    for r in records:
+        groups.setdefault((r["task"], r["scale"]), []).append(r)
+
+    def median(rows, field):
+        values = [r[field] for r in rows if r[field] is not None]
+        return statistics.median(values) if values else None
+
+    def fmt(value, scale=1, digits=1):
+        return "n/a" if value is None else f"{value / scale:.{digits}f}"
+
+    header = f"{'task':<45} {'scale':>5} {'ok':>4} {'wall s':>8} {'cpu s':>8} {'peak MB':>8} {'requests':>8} {'MB in':>8} {'rows':>10}"
+    lines = [header, "-" * len(header)]
+    for (task, scale), rows in sorted(groups.items()):
+        ok = sum(r["succeeded"] for r in rows)
+        peak = [r["peak_rss_mb"] for r in rows if r["peak_rss_mb"] is not None]
+        rows_written = sum(rows[-1]["outputs"].values())
+        lines.append(
+            f"{task:<45} {scale:>5} {f'{ok}/{len(rows)}':>4} {fmt(median(rows, 'wall_seconds'), digits=2):>8} "
+            f"{fmt(median(rows, 'cpu_seconds'), digits=2):>8} {fmt(max(peak) if peak else None, digits=0):>8} "
+            f"{fmt(median(rows, 'http_requests'), digits=0):>8} {fmt(median(rows, 'http_bytes'), 1_048_576):>8} "
+            f"{rows_written:>10}"
+        )
+    return "\n".join(lines)
+
+
+def parse_args():
+    """
+    Parses command-line arguments for the benchmark suite.
+
+    Returns:
+        argparse.Namespace: Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the monitoring scripts against recorded responses")
+    parser.add_argument(
+        "--record",
+        action="store_true",
+        help="Run every script once against the live service and record its responses as fixtures"
+    )
+    parser.add_argument(
+        "--fixtures",
+        type=str,
+        default=DEFAULT_FIXTURE_DIR,
+        help="Directory of recorded responses"
+    )
+    parser.add_argument(
+        "--scales",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SCALES,
+        help="Synthetic data scales to run at (rows of every response repeated this many times)"
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        help="Runs per scale (the summary shows medians)"
+    )
+    parser.add_argument(
+        "--scripts",
+        nargs="+",
+        default=None,
+        help="Only benchmark these scripts (and the scripts they depend on)"
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=1,
+        help="Scripts run at the same time (1 keeps the timings independent)"
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=str,
+        default=DEFAULT_RESULTS_DIR,
+        help="Directory for the results (JSON lines) and the benchmark log"
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    fixture_dir = os.path.abspath(args.fixtures)
+    os.makedirs(args.output_dir, exist_ok=True)
+    run.LOG_FILE = os.path.join(args.output_dir, "benchmark_log.txt")
+
+    try:
+        py_files = select_scripts(args.scripts)
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
+
+    if args.record:
+        run.log(f"Recording fixtures to {fixture_dir}...")
+        records = run_suite(py_files, {REPLAY_ENV: f"record:{fixture_dir}"}, max(1, args.max_workers))
+        failed = [r["task"] for r in records if not r["succeeded"]]
+        n_fixtures = len([f for f in os.listdir(fixture_dir) if f.endswith(".json")]) if os.path.isdir(fixture_dir) else 0
+        run.log(f"Recorded {n_fixtures} responses" + (f"; failed: {', '.join(failed)}" if failed else ""))
+        return
+
+    if not os.path.isdir(fixture_dir):
+        print(f"[ERROR] No fixtures in {fixture_dir}; record them first with --record")
+        sys.exit(1)
+
+    timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    results_path = os.path.join(args.output_dir, f"benchmark_{timestamp}.jsonl")
+    all_records = []
+    for scale in args.scales:
+        for repeat in range(1, args.repeat + 1):
+            run.log(f"Benchmark run: scale {scale}x, repeat {repeat}/{args.repeat}")
+            env = {REPLAY_ENV: f"replay:{fixture_dir}", SCALE_ENV: str(scale)}
+            records = run_suite(py_files, env, max(1, args.max_workers))
+            with open(results_path, "a", encoding="utf-8") as f:
+                for record in records:
+                    record.update(scale=scale, repeat=repeat)
+                    f.write(json.dumps(record) + "\n")
+            all_records.extend(records)
+
+    print()
+    print(summarise(all_records))
+    print(f"\nSaved results to {results_path}")
+
+
+if __name__ == "__main__":
+    main()
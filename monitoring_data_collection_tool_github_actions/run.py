@@ -1,12 +1,24 @@
 import subprocess
 import os
+import ast
 import datetime
 import sys
 import smtplib
 import mimetypes
 import socket
 import io
+import re
+import json
+import time
+import tempfile
 import zipfile
+import argparse
+import threading
+import traceback
+import contextlib
+import importlib.util
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from email.message import EmailMessage
 from email.utils import formatdate, make_msgid
 from pathlib import Path
@@ -16,8 +28,35 @@ PYTHON_EXECUTABLE = sys.executable
 ROOT_DIR = "."
 SCRIPTS_DIR = os.path.join(ROOT_DIR, "scripts")
 LOG_FILE = os.path.join(ROOT_DIR, "documentation/logs", "workflow_log.txt")
+TELEMETRY_FILE = os.path.join(ROOT_DIR, "documentation/logs", "telemetry.jsonl")
 DEFAULT_OUTPUT_DIR = os.path.join(ROOT_DIR, "outputs")
 DOC_OUTPUT_PATH = os.path.join(ROOT_DIR, "documentation", "output_dir.txt")
+SNAPSHOT_SCRIPT = os.path.join(SCRIPTS_DIR, "_snapshot.py")
+
+# Scheduling defaults (scripts may override TIMEOUT and declare DEPENDS_ON)
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_TIMEOUT = 1800
+SNAPSHOT_PREFIX = "snapshot:"
+
+# Report file formats understood by every script's --format flag (see scripts/_output.py)
+OUTPUT_FORMATS = ("csv", "parquet", "both")
+OUTPUT_SUFFIXES = (".csv", ".parquet")
+
+# Email packaging: formats that are already compressed are stored in the zip
+# rather than deflated again
+PRECOMPRESSED_SUFFIXES = {".parquet", ".zip", ".gz", ".png", ".jpg", ".pdf"}
+ZIP_DEFLATE_LEVEL = 6
+COPY_BLOCK_SIZE = 1024 * 1024
+
+# Delta reports: each run's keyed reports are kept in this subdirectory of
+# _snapshot.SNAPSHOT_DIR (cached between runs with the snapshots) and the next
+# run emails only what changed
+PREVIOUS_OUTPUT_SUBDIR = "previous_outputs"
+DELTA_SUBDIR = "delta"
+
+# Per-script telemetry: each script writes its own counters (see
+# scripts/_telemetry.py) to the file named in this environment variable
+TELEMETRY_FILE_ENV = "MONITORING_TELEMETRY_FILE"
 
 try:
     if os.path.isfile(DOC_OUTPUT_PATH):
@@ -30,50 +69,416 @@ except Exception:
     OUTPUT_DIR = DEFAULT_OUTPUT_DIR
 
 
+_log_lock = threading.Lock()
+_telemetry_records = []
+
+
 def log(message: str) -> None:
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     full_msg = f"[{timestamp}] {message}"
-    print(full_msg)
-    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(full_msg + "\n")
-
-
-def run_script(script_path: str, output_dir: str) -> None:
+    with _log_lock:
+        print(full_msg)
+        os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+        with open(LOG_FILE, "a", encoding="utf-8") as f:
+            f.write(full_msg + "\n")
+
+
+def record_telemetry(record: dict) -> None:
+    """Appends one task's telemetry to TELEMETRY_FILE as a JSON line."""
+    with _log_lock:
+        _telemetry_records.append(record)
+        os.makedirs(os.path.dirname(TELEMETRY_FILE), exist_ok=True)
+        with open(TELEMETRY_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+def with_telemetry(name: str, run, telemetry_dir: str | None):
+    """
+    Wraps a task so that its wall time and the counters its script reports
+    (CPU time, peak RSS, HTTP requests and bytes, rows per output file) are
+    recorded. run is called with the path the script should write its
+    counters to; counters are None when the script did not write them
+    (e.g. it was killed on timeout).
+    """
+    def run_measured() -> bool:
+        stats_path = None
+        if telemetry_dir:
+            stats_path = os.path.join(telemetry_dir, re.sub(r"[^\w.-]", "_", name) + ".json")
+        start = time.perf_counter()
+        ok = run(stats_path)
+        wall_seconds = time.perf_counter() - start
+
+        stats = {}
+        if stats_path and os.path.exists(stats_path):
+            try:
+                with open(stats_path, "r", encoding="utf-8") as f:
+                    stats = json.load(f)
+            except (OSError, ValueError) as e:
+                log(f"Could not read telemetry of {name}: {e}")
+        record_telemetry({
+            "run_id": os.environ.get("DATASETTE_RUN_ID"),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "task": name,
+            "succeeded": bool(ok),
+            "wall_seconds": round(wall_seconds, 2),
+            "cpu_seconds": stats.get("cpu_seconds"),
+            "peak_rss_mb": stats.get("peak_rss_mb"),
+            "http_requests": stats.get("http_requests"),
+            "http_bytes": stats.get("http_bytes"),
+            "outputs": stats.get("outputs", {}),
+        })
+        return ok
+    return run_measured
+
+
+def run_command(label: str, cmd: list[str], timeout: float | None = None,
+                telemetry_path: str | None = None) -> bool:
+    env = None
+    if telemetry_path:
+        env = {**os.environ, TELEMETRY_FILE_ENV: telemetry_path}
     try:
         subprocess.run(
-            [PYTHON_EXECUTABLE, script_path, "--output-dir", output_dir],
+            cmd,
             capture_output=True,
             text=True,
             check=True,
+            timeout=timeout,
+            env=env,
         )
-        log(f"SUCCESS: {script_path}")
+        log(f"SUCCESS: {label}")
+        return True
     except subprocess.CalledProcessError as e:
-        log(f"FAIL: {script_path}")
+        log(f"FAIL: {label}")
         log(f"Stdout:\n{(e.stdout or '').strip()}")
         log(f"Stderr:\n{(e.stderr or '').strip()}")
+    except subprocess.TimeoutExpired:
+        log(f"TIMEOUT: {label} (after {timeout}s)")
     except Exception as e:
-        log(f"ERROR: {script_path} - {str(e)}")
+        log(f"ERROR: {label} - {str(e)}")
+    return False
+
+
+def run_script(script_path: str, output_dir: str, timeout: float | None = None,
+               output_format: str | None = None, telemetry_path: str | None = None) -> bool:
+    cmd = [PYTHON_EXECUTABLE, script_path, "--output-dir", output_dir]
+    if output_format:
+        cmd += ["--format", output_format]
+    return run_command(script_path, cmd, timeout, telemetry_path)
+
+
+def run_snapshot(table: str, timeout: float | None = None, telemetry_path: str | None = None) -> bool:
+    return run_command(
+        f"{SNAPSHOT_PREFIX}{table}", [PYTHON_EXECUTABLE, SNAPSHOT_SCRIPT, table], timeout, telemetry_path
+    )
+
+
+# In-process execution (pre-loaded worker processes)
+# Imported once by the fork server, so every forked worker already has them
+WORKER_PRELOAD = ["numpy", "pandas", "_telemetry", "_output", "_datasette"]
+
+
+def worker_context(scripts_dir: str):
+    """
+    Returns the multiprocessing context in-process tasks are started from.
+    Where available this is a fork server that has imported the heavy
+    libraries and shared helpers once, so each task starts as a cheap fork
+    that already has them; elsewhere each task is spawned.
+    """
+    sys.path.insert(0, os.path.abspath(scripts_dir))
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(WORKER_PRELOAD)
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def _run_in_worker(conn, script_path: str, func_name: str, args: tuple,
+                   telemetry_path: str | None = None) -> None:
+    """
+    Loads a script as a fresh module and calls one of its functions, capturing
+    stdout/stderr. Runs in its own worker process, with the telemetry
+    counters reset before and written out after.
+
+    Sends (succeeded, captured stdout, captured stderr) back through conn.
+    """
+    import _telemetry
+    _telemetry.reset()
+    stdout, stderr = io.StringIO(), io.StringIO()
+    ok = True
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            name = "_run_" + Path(script_path).stem
+            spec = importlib.util.spec_from_file_location(name, script_path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            getattr(module, func_name)(*args)
+        except SystemExit as e:
+            ok = e.code in (None, 0)
+        except BaseException:
+            traceback.print_exc()
+            ok = False
+    if telemetry_path:
+        _telemetry.write_report(telemetry_path)
+    conn.send((ok, stdout.getvalue(), stderr.getvalue()))
+    conn.close()
+
+
+def run_in_worker(context, label: str, script_path: str, func_name: str,
+                  args: tuple, timeout: float | None = None, telemetry_path: str | None = None) -> bool:
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_run_in_worker, args=(sender, script_path, func_name, args, telemetry_path)
+    )
+    try:
+        process.start()
+        sender.close()
+        if not receiver.poll(timeout):
+            # Stop the script so it no longer holds a slot; the next task gets a new worker
+            process.terminate()
+            log(f"TIMEOUT: {label} (after {timeout}s, worker terminated)")
+            return False
+        ok, stdout, stderr = receiver.recv()
+    except EOFError:
+        process.join()
+        log(f"ERROR: {label} - worker exited with code {process.exitcode}")
+        return False
+    except Exception as e:
+        log(f"ERROR: {label} - {str(e)}")
+        return False
+    finally:
+        receiver.close()
+        if process.pid is not None:
+            process.join()
+
+    if ok:
+        log(f"SUCCESS: {label}")
+    else:
+        log(f"FAIL: {label}")
+        log(f"Stdout:\n{stdout.strip()}")
+        log(f"Stderr:\n{stderr.strip()}")
+    return ok
+
+
+def read_script_config(script_path: str) -> dict:
+    """
+    Reads the optional DEPENDS_ON / TIMEOUT / DELTA_KEYS constants declared
+    at the top level of a script, without importing it.
+
+    DEPENDS_ON lists other script file names or shared snapshots
+    ("snapshot:<db>/<table>") that must complete first. DELTA_KEYS maps each
+    report the script writes to the columns identifying a row.
+    """
+    config = {"depends_on": [], "timeout": DEFAULT_TIMEOUT, "delta_keys": {}}
+    try:
+        with open(script_path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=script_path)
+    except (OSError, SyntaxError) as e:
+        log(f"Could not read scheduling config from {script_path}: {e}")
+        return config
+
+    for node in tree.body:
+        if not isinstance(node, ast.Assign):
+            continue
+        for target in node.targets:
+            if not isinstance(target, ast.Name):
+                continue
+            try:
+                value = ast.literal_eval(node.value)
+            except ValueError:
+                continue
+            if target.id == "DEPENDS_ON":
+                config["depends_on"] = list(value)
+            elif target.id == "TIMEOUT":
+                config["timeout"] = value
+            elif target.id == "DELTA_KEYS":
+                config["delta_keys"] = dict(value)
+    return config
+
+
+def build_tasks(py_files: list[str], output_dir: str, context=None,
+                output_format: str | None = None, telemetry_dir: str | None = None) -> dict:
+    """
+    Builds the task graph: one task per script plus one per shared snapshot
+    that any script depends on. With a worker context (see worker_context),
+    scripts are run through their main(output_dir) in a pre-loaded worker
+    instead of a new interpreter each (they
+    then pick the output format up from MONITORING_OUTPUT_FORMAT). Every
+    task records its telemetry (see with_telemetry).
+    """
+    tasks = {}
+    for py_file in py_files:
+        full_path = os.path.join(SCRIPTS_DIR, py_file)
+        config = read_script_config(full_path)
+        if context is None:
+            run = lambda path, p=full_path, t=config["timeout"]: run_script(p, output_dir, t, output_format, path)
+        else:
+            run = lambda path, p=full_path, t=config["timeout"]: run_in_worker(
+                context, p, p, "main", (output_dir,), t, path
+            )
+        tasks[py_file] = {"run": with_telemetry(py_file, run, telemetry_dir), "depends_on": set(config["depends_on"])}
+
+        for dep in config["depends_on"]:
+            if dep.startswith(SNAPSHOT_PREFIX) and dep not in tasks:
+                table = dep[len(SNAPSHOT_PREFIX):]
+                if context is None:
+                    run = lambda path, t=table: run_snapshot(t, DEFAULT_TIMEOUT, path)
+                else:
+                    run = lambda path, t=table: run_in_worker(
+                        context, f"{SNAPSHOT_PREFIX}{t}", SNAPSHOT_SCRIPT, "get_snapshot",
+                        tuple(t.split("/", 1)), DEFAULT_TIMEOUT, path
+                    )
+                tasks[dep] = {"run": with_telemetry(dep, run, telemetry_dir), "depends_on": set()}
+    return tasks
+
+
+def run_tasks(tasks: dict, max_workers: int) -> dict:
+    """
+    Runs the task graph with at most max_workers tasks in flight. A task starts
+    as soon as all its dependencies have succeeded; tasks whose dependencies
+    failed (or are unknown / circular) are skipped, and nothing else waits on
+    them.
+
+    Returns:
+        dict: Task name -> True (success) / False (failed or skipped).
+    """
+    results = {}
+    pending = dict(tasks)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            # Skip tasks that can never run
+            for name, task in list(pending.items()):
+                blocked = [
+                    d for d in task["depends_on"]
+                    if results.get(d) is False or (d not in tasks)
+                ]
+                if blocked:
+                    log(f"SKIP: {name} (dependency not satisfied: {', '.join(sorted(blocked))})")
+                    results[name] = False
+                    del pending[name]
+
+            # Start everything that is ready
+            for name, task in list(pending.items()):
+                if all(results.get(d) for d in task["depends_on"]):
+                    log(f"Running: {name}")
+                    running[executor.submit(task["run"])] = name
+                    del pending[name]
+
+            if not running:
+                for name in pending:
+                    log(f"SKIP: {name} (circular dependency)")
+                    results[name] = False
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = bool(future.result())
+                except Exception as e:
+                    log(f"ERROR: {name} - {str(e)}")
+                    results[name] = False
+    return results
+
+
+def compute_deltas(py_files: list[str], results: dict, output_dir: str) -> list[dict]:
+    """
+    Writes the delta of each keyed report against the previous run's copy
+    (see scripts/_delta.py), then keeps this run's reports for the next one.
+    Only scripts that succeeded are compared and kept, so a failed script
+    neither reports a stale file nor replaces the last good copy.
+
+    Returns:
+        list: Per-report summaries (report, added, removed, changed, paths).
+    """
+    delta_keys = {}
+    for py_file in py_files:
+        if results.get(py_file):
+            delta_keys.update(read_script_config(os.path.join(SCRIPTS_DIR, py_file))["delta_keys"])
+    if not delta_keys:
+        return []
+
+    # File-relative, so the previous reports are found whatever the working directory
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+    from _delta import keep_as_previous, write_deltas
+    from _snapshot import SNAPSHOT_DIR
+
+    previous_dir = os.path.join(SNAPSHOT_DIR, PREVIOUS_OUTPUT_SUBDIR)
+    summaries = write_deltas(output_dir, previous_dir, os.path.join(output_dir, DELTA_SUBDIR), delta_keys)
+    for summary in summaries:
+        log(
+            f"DELTA: {summary['report']} - {summary['added']} added, "
+            f"{summary['removed']} removed, {summary['changed']} changed"
+        )
+    keep_as_previous(output_dir, previous_dir, list(delta_keys))
+    return summaries
 
 
-def discover_csvs(output_dir: str) -> list[Path]:
+def discover_outputs(output_dir: str) -> list[Path]:
     p = Path(output_dir)
     if not p.exists():
         return []
-    return sorted(p.glob("*.csv"))
+    return sorted(f for f in p.iterdir() if f.is_file() and f.suffix in OUTPUT_SUFFIXES)
 
 
 def total_size(paths: list[Path]) -> int:
     return sum(f.stat().st_size for f in paths if f.exists())
 
 
-def build_zip_in_memory(files: list[Path], zip_name: str = "outputs.zip") -> tuple[str, bytes]:
-    mem = io.BytesIO()
-    with zipfile.ZipFile(mem, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+def zip_compression(file_path: Path) -> tuple[int, int | None]:
+    """
+    Returns the (compress_type, compresslevel) used for a file in the outputs
+    zip: already-compressed formats are stored as-is, text is deflated.
+    """
+    if file_path.suffix.lower() in PRECOMPRESSED_SUFFIXES:
+        return zipfile.ZIP_STORED, None
+    return zipfile.ZIP_DEFLATED, ZIP_DEFLATE_LEVEL
+
+
+def build_zip_file(files: list[Path], zip_path: Path) -> Path:
+    """
+    Writes the files into a zip archive on disk. zipfile streams each file in
+    small blocks, so memory use does not grow with the size of the outputs.
+    """
+    with zipfile.ZipFile(zip_path, mode="w") as zf:
         for f in files:
-            zf.write(f, arcname=f.name)
-    mem.seek(0)
-    return zip_name, mem.read()
+            compress_type, compresslevel = zip_compression(f)
+            zf.write(f, arcname=f.name, compress_type=compress_type, compresslevel=compresslevel)
+    return zip_path
+
+
+def split_into_volumes(file_path: Path, max_bytes: int) -> list[Path]:
+    """
+    Splits a file into numbered volumes (<name>.001, <name>.002, ...) of at
+    most max_bytes each, copying in blocks. A file that already fits is
+    returned unchanged.
+
+    The volumes are rejoined by concatenating them in order, e.g.
+    `copy /b outputs.zip.001+outputs.zip.002 outputs.zip`, or opened directly
+    with 7-Zip.
+    """
+    if file_path.stat().st_size <= max_bytes:
+        return [file_path]
+
+    volumes = []
+    with open(file_path, "rb") as src:
+        while True:
+            volume = file_path.with_name(f"{file_path.name}.{len(volumes) + 1:03d}")
+            written = 0
+            with open(volume, "wb") as dst:
+                while written < max_bytes:
+                    block = src.read(min(COPY_BLOCK_SIZE, max_bytes - written))
+                    if not block:
+                        break
+                    dst.write(block)
+                    written += len(block)
+            if written == 0:
+                volume.unlink()
+                break
+            volumes.append(volume)
+    file_path.unlink()
+    return volumes
 
 
 def attach_file(msg: EmailMessage, file_path: Path) -> None:
@@ -90,7 +495,65 @@ def attach_file(msg: EmailMessage, file_path: Path) -> None:
         )
 
 
-def send_email_with_outputs(output_dir: str) -> None:
+def build_message(subject: str, from_addr: str, to_addrs: list[str], body: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg["Subject"] = subject
+    msg["From"] = from_addr
+    msg["To"] = ", ".join(to_addrs)
+    msg["Date"] = formatdate(localtime=True)
+    msg["Message-ID"] = make_msgid()
+    msg.set_content(body)
+    return msg
+
+
+def select_email_files(output_dir: str, deltas: list[dict], email_full: bool) -> list[Path]:
+    """
+    Picks the files to email: the delta of each compared report, plus the
+    full file of every report without a delta (new, unkeyed or not
+    comparable). With email_full, every full report is attached as well.
+    """
+    outputs = discover_outputs(output_dir)
+    compared = {d["report"] for d in deltas}
+    delta_files = [Path(p) for d in deltas for p in d["paths"]]
+    if email_full:
+        return delta_files + outputs
+    return delta_files + [f for f in outputs if f.stem + ".csv" not in compared]
+
+
+def delta_summary(deltas: list[dict]) -> str:
+    """Formats the per-report change counts for the email body."""
+    if not deltas:
+        return ""
+    lines = [
+        f"  {d['report']}: {d['added']} added, {d['removed']} removed, {d['changed']} changed"
+        for d in deltas
+    ]
+    return (
+        "Changes since the previous run (the .delta files list the rows; "
+        "full reports are attached only for reports without a delta):\n" + "\n".join(lines)
+    )
+
+
+def telemetry_summary(records: list[dict]) -> str:
+    """Formats the per-task telemetry for the email body, slowest first."""
+    def fmt(value, unit="", scale=1, digits=1):
+        return "n/a" if value is None else f"{value / scale:.{digits}f}{unit}"
+
+    lines = []
+    for r in sorted(records, key=lambda r: r["wall_seconds"], reverse=True):
+        rows = ", ".join(f"{name} {count}" for name, count in r["outputs"].items()) or "no output"
+        lines.append(
+            f"  {r['task']}{'' if r['succeeded'] else ' (FAILED)'}: "
+            f"{fmt(r['wall_seconds'], 's')} wall, {fmt(r['cpu_seconds'], 's')} CPU, "
+            f"{fmt(r['peak_rss_mb'], ' MB', digits=0)} peak RSS, "
+            f"{'n/a' if r['http_requests'] is None else r['http_requests']} requests, "
+            f"{fmt(r['http_bytes'], ' MB', scale=1_048_576)} downloaded; rows: {rows}"
+        )
+    return "Script telemetry (also in documentation/logs/telemetry.jsonl):\n" + "\n".join(lines)
+
+
+def send_email_with_outputs(output_dir: str, deltas: list[dict] | None = None, email_full: bool = False,
+                            telemetry: list[dict] | None = None) -> None:
     # 🔑 CHANGE THESE:
     SMTP_HOST = "smtp.office365.com"
     SMTP_PORT = 587
@@ -103,10 +566,12 @@ def send_email_with_outputs(output_dir: str) -> None:
     BODY_TEXT = "Automated export attached.\n\nThis email was sent by the workflow script."
     ZIP_THRESHOLD_MB = 15.0
     MAX_ATTACHMENTS = 15
+    # Attachment bytes per message; base64 adds a third, so this stays under a 35 MB mail limit
+    MAX_MESSAGE_MB = 20.0
 
-    csv_files = discover_csvs(output_dir)
+    csv_files = select_email_files(output_dir, deltas or [], email_full)
     if not csv_files:
-        log(f"No CSV files found to email in: {output_dir}")
+        log(f"No output files found to email in: {output_dir}")
         return
 
     total_bytes = total_size(csv_files)
@@ -115,40 +580,88 @@ def send_email_with_outputs(output_dir: str) -> None:
     today_str = datetime.date.today().strftime("%Y-%m-%d")
     host = socket.gethostname()
     subject = f"{SUBJECT_PREFIX} {today_str}"
-
-    msg = EmailMessage()
-    msg["Subject"] = subject
-    msg["From"] = FROM_ADDR
-    msg["To"] = ", ".join(TO_ADDRS)
-    msg["Date"] = formatdate(localtime=True)
-    msg["Message-ID"] = make_msgid()
     body = f"{BODY_TEXT}\n\nMachine: {host}\nOutput directory: {os.path.abspath(output_dir)}"
-    msg.set_content(body)
-
-    if must_zip:
-        zip_name, zip_bytes = build_zip_in_memory(csv_files, f"outputs_{today_str}.zip")
-        msg.add_attachment(zip_bytes, maintype="application", subtype="zip", filename=zip_name)
-        log(
-            f"Attaching ZIP '{zip_name}' with {len(csv_files)} files "
-            f"(~{total_bytes/1_048_576:.2f} MB) due to size/count threshold."
-        )
-    else:
-        for f in csv_files:
-            attach_file(msg, f)
-        log(f"Attaching {len(csv_files)} CSV file(s) (~{total_bytes/1_048_576:.2f} MB).")
-
-    try:
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=60) as server:
-            server.starttls()
-            server.login(SMTP_USERNAME, SMTP_PASSWORD)
-            server.send_message(msg, from_addr=FROM_ADDR, to_addrs=TO_ADDRS)
-        log(f"Email sent to: {', '.join(TO_ADDRS)}")
-    except Exception as e:
-        log(f"Failed to send email: {e}")
-        raise
+    if deltas:
+        body += "\n\n" + delta_summary(deltas)
+    if telemetry:
+        body += "\n\n" + telemetry_summary(telemetry)
+
+    with tempfile.TemporaryDirectory(prefix="outputs_zip_") as tmp_dir:
+        # Attachments of each message: the output files themselves, or the
+        # volumes of a zip streamed to disk (read back one message at a time)
+        if must_zip:
+            zip_path = build_zip_file(csv_files, Path(tmp_dir) / f"outputs_{today_str}.zip")
+            zip_bytes = zip_path.stat().st_size
+            volumes = split_into_volumes(zip_path, int(MAX_MESSAGE_MB * 1024 * 1024))
+            parts = [[v] for v in volumes]
+            log(
+                f"Attaching ZIP '{zip_path.name}' with {len(csv_files)} files "
+                f"(~{total_bytes/1_048_576:.2f} MB, {zip_bytes/1_048_576:.2f} MB zipped) "
+                f"in {len(volumes)} message(s) due to size/count threshold."
+            )
+        else:
+            parts = [csv_files]
+            log(f"Attaching {len(csv_files)} output file(s) (~{total_bytes/1_048_576:.2f} MB).")
+
+        try:
+            with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=60) as server:
+                server.starttls()
+                server.login(SMTP_USERNAME, SMTP_PASSWORD)
+                for i, attachments in enumerate(parts, start=1):
+                    if len(parts) == 1:
+                        msg = build_message(subject, FROM_ADDR, TO_ADDRS, body)
+                    else:
+                        msg = build_message(
+                            f"{subject} (part {i} of {len(parts)})", FROM_ADDR, TO_ADDRS,
+                            f"{body}\n\nThe zip is split into {len(parts)} volumes, one per email. "
+                            f"Save all of them and open the .001 file with 7-Zip, or join them with "
+                            f"`copy /b {zip_path.name}.001+{zip_path.name}.002+... {zip_path.name}`."
+                        )
+                    for f in attachments:
+                        attach_file(msg, f)
+                    server.send_message(msg, from_addr=FROM_ADDR, to_addrs=TO_ADDRS)
+            log(f"Email sent to: {', '.join(TO_ADDRS)}")
+        except Exception as e:
+            log(f"Failed to send email: {e}")
+            raise
+
+
+def parse_args():
+    """
+    Parses command-line arguments for the workflow runner.
+
+    Returns:
+        argparse.Namespace: Parsed args containing the concurrency limit.
+    """
+    parser = argparse.ArgumentParser(description="Run all monitoring scripts and email the outputs")
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=DEFAULT_MAX_WORKERS,
+        help="Maximum number of scripts to run at the same time"
+    )
+    parser.add_argument(
+        "--mode",
+        choices=["subprocess", "inprocess"],
+        default="subprocess",
+        help="Run each script in a new interpreter, or call its main(output_dir) in a pre-loaded worker"
+    )
+    parser.add_argument(
+        "--format",
+        choices=OUTPUT_FORMATS,
+        default="csv",
+        help="Report file format passed through to every script"
+    )
+    parser.add_argument(
+        "--email-full",
+        action="store_true",
+        help="Attach every full report, not only the day-over-day deltas"
+    )
+    return parser.parse_args()
 
 
 def main() -> None:
+    args = parse_args()
     log("Starting workflow...")
 
     if not os.path.exists(SCRIPTS_DIR):
@@ -157,19 +670,37 @@ def main() -> None:
 
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+    # Shared Datasette table snapshots are downloaded at most once per run
+    os.environ["DATASETTE_RUN_ID"] = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    # Seen by in-process workers; subprocess scripts also get --format
+    os.environ["MONITORING_OUTPUT_FORMAT"] = args.format
+
     py_files = sorted(f for f in os.listdir(SCRIPTS_DIR) if f.endswith(".py") and not f.startswith("_"))
 
     if not py_files:
         log("No Python scripts found in scripts directory.")
         return
 
-    for py_file in py_files:
-        full_path = os.path.join(SCRIPTS_DIR, py_file)
-        log(f"Running: {py_file}")
-        run_script(full_path, OUTPUT_DIR)
+    max_workers = max(1, args.max_workers)
+    with tempfile.TemporaryDirectory(prefix="telemetry_") as telemetry_dir:
+        if args.mode == "inprocess":
+            results = run_tasks(
+                build_tasks(py_files, OUTPUT_DIR, worker_context(SCRIPTS_DIR), args.format, telemetry_dir),
+                max_workers,
+            )
+        else:
+            results = run_tasks(
+                build_tasks(py_files, OUTPUT_DIR, output_format=args.format, telemetry_dir=telemetry_dir),
+                max_workers,
+            )
+    failed = sorted(name for name, ok in results.items() if not ok)
+    if failed:
+        log(f"{len(failed)} of {len(results)} task(s) did not succeed: {', '.join(failed)}")
+
+    deltas = compute_deltas(py_files, results, OUTPUT_DIR)
 
     log("All scripts complete. Emailing outputs...")
-    send_email_with_outputs(OUTPUT_DIR)
+    send_email_with_outputs(OUTPUT_DIR, deltas, args.email_full, _telemetry_records)
     log("Workflow complete.")
 
 
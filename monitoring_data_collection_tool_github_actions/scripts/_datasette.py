@@ -0,0 +1,349 @@
+"""
+Shared Datasette client used by every script in this folder.
+
+All requests to the ODP Datasette service go through one long-lived
+requests.Session per process, so pages of a query (and queries of a script)
+reuse pooled keep-alive connections instead of paying a new TLS handshake
+each time. The session negotiates gzip, and has a single retry policy.
+
+The connection pool size can be tuned with the DATASETTE_POOL_SIZE
+environment variable (default 10).
+
+This module is prefixed with an underscore so run.py does not execute it.
+"""
+
+import os
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+from _telemetry import count_response
+from _replay import install_from_env
+
+DATASETTE_URL = "https://datasette.planning.data.gov.uk"
+
+# Connection pool / retry settings
+POOL_SIZE = int(os.environ.get("DATASETTE_POOL_SIZE", "10"))
+REQUEST_TIMEOUT = 120
+
+# Datasette answers 400 when a query hits its time limit, so it is retried
+# alongside the usual transient server errors.
+RETRY_STRATEGY = Retry(
+    total=3,
+    status_forcelist=[400, 429, 500, 502, 503, 504],
+    allowed_methods=["GET", "HEAD"],
+    backoff_factor=0.2,
+    raise_on_status=False,
+)
+
+_session = None
+_session_lock = threading.Lock()
+
+# Offline record / replay of responses when DATASETTE_REPLAY is set (see _replay.py)
+install_from_env()
+
+
+# HTTP Helpers
+def get_datasette_http():
+    """
+    Returns the shared requests session for querying Datasette.
+
+    The session is created on first use and reused afterwards, so every
+    caller in the process shares the same connection pool.
+
+    Returns:
+        requests.Session: Pooled session with keep-alive, gzip and retries.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                adapter = HTTPAdapter(
+                    pool_connections=POOL_SIZE,
+                    pool_maxsize=POOL_SIZE,
+                    max_retries=RETRY_STRATEGY,
+                )
+                http = requests.Session()
+                http.headers.update({
+                    "Accept-Encoding": "gzip, deflate",
+                    "Connection": "keep-alive",
+                })
+                http.mount("https://", adapter)
+                http.mount("http://", adapter)
+                # Request and byte counts for run.py's telemetry
+                http.hooks["response"].append(count_response)
+                _session = http
+    return _session
+
+
+# Datasette Query Helpers
+def get_datasette_json(db: str, sql: str, params=None, url=DATASETTE_URL) -> dict:
+    """
+    Executes SQL against a Datasette database and returns the raw JSON body.
+
+    Args:
+        db (str): The name of the Datasette database (e.g., 'digital-land').
+        sql (str): SQL query string to run.
+        params (dict, optional): Additional query parameters.
+        url (str): Base URL of the Datasette instance.
+
+    Returns:
+        dict | list: Decoded JSON response.
+
+    Raises:
+        requests.HTTPError: If the request fails after retries.
+    """
+    query = {"sql": sql}
+    if params:
+        query.update(params)
+    response = get_datasette_http().get(f"{url}/{db}.json", params=query, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def get_datasette_query(db: str, sql: str, filter=None, url=DATASETTE_URL) -> pd.DataFrame:
+    """
+    Executes SQL against a Datasette database and returns the result as a DataFrame.
+
+    Args:
+        db (str): The name of the Datasette database (e.g., 'digital-land').
+        sql (str): SQL query string to run.
+        filter (dict, optional): Additional query parameters.
+        url (str): Base URL of the Datasette instance.
+
+    Returns:
+        pd.DataFrame: The result set, or empty DataFrame on error.
+    """
+    params = {"_shape": "array", "_size": "max"}
+    if filter:
+        params.update(filter)
+    try:
+        return pd.DataFrame.from_dict(get_datasette_json(db, sql, params, url=url))
+    except Exception as e:
+        print(f"[ERROR] Datasette query failed: {e}")
+        return pd.DataFrame()
+
+
+def read_datasette_csv(path: str, url=DATASETTE_URL, **read_csv_kwargs) -> pd.DataFrame:
+    """
+    Streams a Datasette CSV export (e.g. 'digital-land/endpoint.csv?_stream=on')
+    through the shared session into a DataFrame.
+
+    Args:
+        path (str): Path of the CSV export relative to the Datasette URL.
+        url (str): Base URL of the Datasette instance.
+        **read_csv_kwargs: Passed through to pd.read_csv.
+
+    Returns:
+        pd.DataFrame: Parsed CSV content.
+
+    Raises:
+        requests.HTTPError: If the request fails after retries.
+    """
+    with get_datasette_http().get(_csv_url(path, url), stream=True, timeout=REQUEST_TIMEOUT) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        return pd.read_csv(response.raw, **read_csv_kwargs)
+
+
+def iter_datasette_csv(path: str, chunksize: int, url=DATASETTE_URL, **read_csv_kwargs):
+    """
+    Streams a Datasette CSV export and yields it as DataFrame chunks, keeping
+    the response open between chunks, so only one chunk is parsed and held
+    in memory at a time.
+
+    Args:
+        path (str): Path of the CSV export relative to the Datasette URL.
+        chunksize (int): Rows per yielded chunk.
+        url (str): Base URL of the Datasette instance.
+        **read_csv_kwargs: Passed through to pd.read_csv (e.g. usecols, dtype).
+
+    Yields:
+        pd.DataFrame: Consecutive chunks of the CSV.
+
+    Raises:
+        requests.HTTPError: If the request fails after retries.
+    """
+    with get_datasette_http().get(_csv_url(path, url), stream=True, timeout=REQUEST_TIMEOUT) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        with pd.read_csv(response.raw, chunksize=chunksize, **read_csv_kwargs) as reader:
+            yield from reader
+
+
+def _csv_url(path: str, url=DATASETTE_URL) -> str:
+    return path if path.startswith("http") else f"{url}/{path.lstrip('/')}"
+
+
+# Pagination Helpers
+def _sql_literal(value) -> str:
+    """
+    Renders a key value from a previous page as an SQL literal.
+
+    Values are inlined rather than passed as named parameters because
+    Datasette sends parameters as text, which would not compare correctly
+    against integer keys such as rowid.
+    """
+    if value is None:
+        return "NULL"
+    if isinstance(value, (bool, int, float)):
+        return repr(int(value) if isinstance(value, bool) else value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def iter_datasette_keyset_pages(db: str, sql: str, keys=("rowid",), page_size=1000,
+                                descending=False, strict=False, url=DATASETTE_URL):
+    """
+    Yields the pages of a query one at a time using keyset pagination.
+
+    Each page asks for rows whose key is past the last key seen, so the
+    server seeks straight to the next page instead of rescanning the earlier
+    rows as LIMIT/OFFSET does, and rows added mid-run cannot shift pages.
+    Only one page is held in memory at a time. The query must select the key
+    columns under the names given in `keys`, and together they must identify
+    a row uniquely and never be NULL (use COALESCE(x.rowid, 0) for keys
+    coming from a LEFT JOIN).
+
+    Args:
+        db (str): The name of the Datasette database (e.g., 'performance').
+        sql (str): SQL query string, without ORDER BY / LIMIT.
+        keys (tuple): Names of the selected key columns, compared in order.
+        page_size (int): Rows per page (Datasette caps this at 1000).
+        descending (bool): Walk the keys from highest to lowest.
+        strict (bool): Raise if a page fails instead of stopping early.
+        url (str): Base URL of the Datasette instance.
+
+    Yields:
+        pd.DataFrame: One non-empty page, in key order. Stops early on error
+        unless strict is set.
+
+    Raises:
+        requests.HTTPError: If strict is set and a page request fails.
+        ValueError: If a key is NULL on the last row of a full page.
+    """
+    keys = list(keys)
+    key_list = ", ".join(keys)
+    order = ", ".join(f"{k} DESC" for k in keys) if descending else key_list
+    op = "<" if descending else ">"
+    last_key = None
+    while True:
+        where = ""
+        if last_key is not None:
+            where = f"WHERE ({key_list}) {op} ({', '.join(_sql_literal(v) for v in last_key)})"
+        page_sql = f"""
+            SELECT * FROM ({sql}) AS keyset_page
+            {where}
+            ORDER BY {order}
+            LIMIT {int(page_size)}
+        """
+        if strict:
+            page = pd.DataFrame.from_dict(
+                get_datasette_json(db, page_sql, {"_shape": "array", "_size": "max"}, url=url)
+            )
+        else:
+            page = get_datasette_query(db, page_sql, url=url)
+        if page.empty:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        last_key = tuple(page.iloc[-1][k] for k in keys)
+        last_key = tuple(v.item() if hasattr(v, "item") else v for v in last_key)
+        # A NULL key cannot be compared, so the next page would be wrong
+        if any(pd.isna(v) for v in last_key):
+            raise ValueError(f"Keyset key ({key_list}) is NULL on the last row of a page: {last_key}")
+
+
+def get_datasette_keyset_query(db: str, sql: str, keys=("rowid",), page_size=1000,
+                               drop_keys=True, url=DATASETTE_URL) -> pd.DataFrame:
+    """
+    Fetches every row of a query using keyset pagination
+    (see iter_datasette_keyset_pages).
+
+    Args:
+        db (str): The name of the Datasette database (e.g., 'performance').
+        sql (str): SQL query string, without ORDER BY / LIMIT.
+        keys (tuple): Names of the selected key columns, compared in order.
+        page_size (int): Rows per page (Datasette caps this at 1000).
+        drop_keys (bool): Remove the key columns from the result.
+        url (str): Base URL of the Datasette instance.
+
+    Returns:
+        pd.DataFrame: All pages concatenated in key order, or empty DataFrame on error.
+    """
+    pages = list(iter_datasette_keyset_pages(db, sql, keys=keys, page_size=page_size, url=url))
+    if not pages:
+        return pd.DataFrame()
+    df = pd.concat(pages, ignore_index=True)
+    if drop_keys:
+        df = df.drop(columns=list(keys), errors="ignore")
+    return df
+
+
+def get_datasette_parallel_query(db: str, sql: str, keys=("rowid",), page_size=1000,
+                                 max_workers=4, drop_keys=True, url=DATASETTE_URL) -> pd.DataFrame:
+    """
+    Fetches every row of a query by splitting it into rowid ranges that are
+    downloaded concurrently.
+
+    A single count query finds the number of rows and the range of the first
+    key (which must be an integer, e.g. a rowid). The range is cut into one
+    window per expected page, and each window is keyset-paginated on its own
+    thread of a bounded pool sharing the pooled session. Windows are
+    reassembled in key order, so the result matches
+    get_datasette_keyset_query.
+
+    Args:
+        db (str): The name of the Datasette database (e.g., 'performance').
+        sql (str): SQL query string, without ORDER BY / LIMIT.
+        keys (tuple): Names of the selected key columns; the first is used for ranges.
+        page_size (int): Rows per page (Datasette caps this at 1000).
+        max_workers (int): Maximum concurrent requests (capped at the pool size).
+        drop_keys (bool): Remove the key columns from the result.
+        url (str): Base URL of the Datasette instance.
+
+    Returns:
+        pd.DataFrame: All rows in key order (empty only when the query has no rows).
+
+    Raises:
+        requests.HTTPError: If the count query or any page fails, so a
+        partial result is never returned.
+    """
+    keys = list(keys)
+    range_key = keys[0]
+    bounds = get_datasette_json(
+        db,
+        f"SELECT MIN({range_key}) AS lo, MAX({range_key}) AS hi, COUNT(*) AS n FROM ({sql}) AS keyset_bounds",
+        {"_shape": "array"},
+        url=url,
+    )[0]
+    if not bounds["n"]:
+        return pd.DataFrame()
+
+    lo, hi, n = int(bounds["lo"]), int(bounds["hi"]), int(bounds["n"])
+    n_windows = max(1, min(math.ceil(n / page_size), hi - lo + 1))
+    step = math.ceil((hi - lo + 1) / n_windows)
+    windows = [
+        f"SELECT * FROM ({sql}) AS keyset_window "
+        f"WHERE {range_key} >= {start} AND {range_key} < {start + step}"
+        for start in range(lo, hi + 1, step)
+    ]
+
+    def fetch_window(window_sql):
+        # strict: a failed page raises instead of silently ending the window
+        return list(iter_datasette_keyset_pages(
+            db, window_sql, keys=keys, page_size=page_size, strict=True, url=url
+        ))
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, POOL_SIZE))) as executor:
+        pages = [page for window in executor.map(fetch_window, windows) for page in window]
+
+    if not pages:
+        return pd.DataFrame()
+    df = pd.concat(pages, ignore_index=True)
+    if drop_keys:
+        df = df.drop(columns=keys, errors="ignore")
+    return df
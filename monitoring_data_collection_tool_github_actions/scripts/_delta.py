@@ -0,0 +1,194 @@
+"""
+Day-over-day delta reports for the monitoring outputs.
+
+Scripts declare the key columns of each report they write as a top-level
+constant, which run.py reads without importing the script:
+
+    DELTA_KEYS = {"odp-status.csv": ["organisation", "cohort", "pipeline", "endpoint"]}
+
+After a run, each keyed report is compared with the copy kept from the
+previous run and a <report>.delta file is written listing the rows that were
+added, removed or changed. Rows are matched on their keys with one outer
+merge per report (when a key repeats, its rows are paired in file order) and
+compared with vectorised row hashes, never row by row.
+
+Values are compared as text, so a report reads the same whether it was
+written as CSV or Parquet.
+
+Usage (from run.py):
+    from _delta import write_deltas, keep_as_previous
+
+    summaries = write_deltas(output_dir, previous_dir, delta_dir, delta_keys)
+    keep_as_previous(output_dir, previous_dir, reports)
+"""
+
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from _output import parquet_path, read_output, write_output
+
+CHANGE_COLUMN = "change"
+CHANGED_COLUMNS_COLUMN = "changed_columns"
+PREVIOUS_SUFFIX = "_previous"
+OCCURRENCE_COLUMN = "_occurrence"
+
+
+def delta_name(report: str) -> str:
+    """Returns the file name of a report's delta (odp-status.csv -> odp-status.delta.csv)."""
+    stem, ext = os.path.splitext(report)
+    return f"{stem}.delta{ext}"
+
+
+def report_exists(csv_path: str) -> bool:
+    """True when a report was written as CSV and/or Parquet."""
+    return os.path.exists(csv_path) or os.path.exists(parquet_path(csv_path))
+
+
+def _as_text(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts every column to str, with missing values as ''. Columns that are
+    already plain strings (CSV read with dtype=str) are left as they are.
+    """
+    converted = {
+        col: values.astype(object).where(values.notna(), "").astype(str)
+        for col, values in df.items()
+        if values.dtype != object or values.isna().any()
+    }
+    return df.assign(**converted) if converted else df
+
+
+def diff_reports(previous: pd.DataFrame, current: pd.DataFrame, keys: list[str]) -> tuple[pd.DataFrame, dict]:
+    """
+    Computes the keyed differences between two versions of a report.
+
+    Only the key columns are merged. Rows present in both versions are then
+    compared by a hash of their values, and cell by cell only where the
+    hashes differ, so unchanged rows cost one hash each.
+
+    Args:
+        previous (pd.DataFrame): The report from the previous run.
+        current (pd.DataFrame): The report from this run.
+        keys (list): Columns identifying a row.
+
+    Returns:
+        tuple:
+            - pd.DataFrame: One row per added, removed or changed row, with a
+              change column, the key and value columns (current values, or the
+              previous ones for removed rows), the names of the changed columns
+              and <column>_previous for each column that changed anywhere.
+            - dict: Counts of added, removed and changed rows.
+    """
+    value_cols = [c for c in current.columns if c not in keys]
+    value_cols += [c for c in previous.columns if c not in keys and c not in value_cols]
+    columns = keys + value_cols
+    current = _as_text(current.reindex(columns=columns, fill_value="")).reset_index(drop=True)
+    previous = _as_text(previous.reindex(columns=columns, fill_value="")).reset_index(drop=True)
+
+    # Match rows on their keys (repeated keys are paired in file order)
+    sides = []
+    for df, row in ((current, "_current_row"), (previous, "_previous_row")):
+        side = df[keys].copy()
+        side[OCCURRENCE_COLUMN] = side.groupby(keys, sort=False).cumcount()
+        side[row] = np.arange(len(df))
+        sides.append(side)
+    matched = sides[0].merge(sides[1], on=keys + [OCCURRENCE_COLUMN], how="outer", indicator=True, sort=False)
+
+    added_rows = matched.loc[matched["_merge"] == "left_only", "_current_row"].to_numpy(dtype="int64")
+    removed_rows = matched.loc[matched["_merge"] == "right_only", "_previous_row"].to_numpy(dtype="int64")
+    both = matched[matched["_merge"] == "both"]
+    current_rows = both["_current_row"].to_numpy(dtype="int64")
+    previous_rows = both["_previous_row"].to_numpy(dtype="int64")
+
+    # Rows in both versions whose values differ, then the columns that differ
+    if value_cols:
+        current_hash = pd.util.hash_pandas_object(current[value_cols], index=False).to_numpy()
+        previous_hash = pd.util.hash_pandas_object(previous[value_cols], index=False).to_numpy()
+        candidates = current_hash[current_rows] != previous_hash[previous_rows]
+        current_rows, previous_rows = current_rows[candidates], previous_rows[candidates]
+        differs = (
+            current[value_cols].to_numpy()[current_rows] != previous[value_cols].to_numpy()[previous_rows]
+        )
+        changed = differs.any(axis=1)
+        current_rows, previous_rows, differs = current_rows[changed], previous_rows[changed], differs[changed]
+    else:
+        current_rows = previous_rows = np.array([], dtype="int64")
+        differs = np.zeros((0, 0), dtype=bool)
+
+    changed_columns = pd.Series("", index=range(len(current_rows)))
+    for i, col in enumerate(value_cols):
+        changed_columns = changed_columns.where(~differs[:, i], changed_columns + col + ";")
+    shown = [col for i, col in enumerate(value_cols) if differs[:, i].any()]
+
+    changed_df = current.iloc[current_rows].reset_index(drop=True).assign(
+        **{CHANGE_COLUMN: "changed", CHANGED_COLUMNS_COLUMN: changed_columns.str.rstrip(";").to_numpy()},
+        **{col + PREVIOUS_SUFFIX: previous[col].to_numpy()[previous_rows] for col in shown},
+    )
+    added_df = current.iloc[added_rows].assign(**{CHANGE_COLUMN: "added"})
+    removed_df = previous.iloc[removed_rows].assign(**{CHANGE_COLUMN: "removed"})
+
+    delta = pd.concat([added_df, removed_df, changed_df], ignore_index=True).reindex(
+        columns=[CHANGE_COLUMN] + columns + [CHANGED_COLUMNS_COLUMN] + [c + PREVIOUS_SUFFIX for c in shown],
+        fill_value="",
+    ).fillna("")
+    counts = {"added": len(added_rows), "removed": len(removed_rows), "changed": len(current_rows)}
+    return delta, counts
+
+
+def write_deltas(output_dir: str, previous_dir: str, delta_dir: str, delta_keys: dict) -> list[dict]:
+    """
+    Writes the delta of every keyed report that exists in both this run's
+    outputs and the previous run's copy.
+
+    Args:
+        output_dir (str): This run's outputs.
+        previous_dir (str): Reports kept from the previous run.
+        delta_dir (str): Directory for the delta files (emptied first).
+        delta_keys (dict): Report file name -> key columns.
+
+    Returns:
+        list: One dict per report with report, added, removed, changed and
+        paths (the delta files written). Reports that could not be compared
+        are left out, so their full file is sent instead.
+    """
+    shutil.rmtree(delta_dir, ignore_errors=True)
+    os.makedirs(delta_dir, exist_ok=True)
+
+    summaries = []
+    for report, keys in sorted(delta_keys.items()):
+        current_path = os.path.join(output_dir, report)
+        previous_path = os.path.join(previous_dir, report)
+        if not (report_exists(current_path) and report_exists(previous_path)):
+            continue
+        try:
+            current = read_output(current_path, dtype=str, keep_default_na=False)
+            previous = read_output(previous_path, dtype=str, keep_default_na=False)
+            missing = [k for k in keys if k not in current.columns or k not in previous.columns]
+            if missing:
+                print(f"[WARNING] {report}: key column(s) {', '.join(missing)} not found, sending the full report")
+                continue
+            delta, counts = diff_reports(previous, current, list(keys))
+        except Exception as e:
+            print(f"[WARNING] {report}: could not compute delta ({e}), sending the full report")
+            continue
+        paths = write_output(delta, os.path.join(delta_dir, delta_name(report)))
+        summaries.append({"report": report, **counts, "paths": paths})
+    return summaries
+
+
+def keep_as_previous(output_dir: str, previous_dir: str, reports: list[str]) -> None:
+    """
+    Copies this run's version of each report (CSV and/or Parquet) over the
+    previous run's copy. Reports not written this run keep their old copy.
+    """
+    os.makedirs(previous_dir, exist_ok=True)
+    for report in reports:
+        current_path = os.path.join(output_dir, report)
+        if not report_exists(current_path):
+            continue
+        for path in (current_path, parquet_path(current_path)):
+            kept = os.path.join(previous_dir, os.path.basename(path))
+            if os.path.exists(path):
+                shutil.copyfile(path, kept)
+            elif os.path.exists(kept):
+                os.remove(kept)
@@ -0,0 +1,215 @@
+"""
+Shared writer for report outputs.
+
+Scripts hand every report DataFrame to write_output() with the CSV path they
+have always used. Depending on the output format the report is written as:
+- csv: the CSV only (default)
+- parquet: a typed, zstd-compressed Parquet file next to it (same name, .parquet)
+- both: the two side by side
+
+The format is chosen with the --format flag (see add_format_argument), which
+run.py passes through, or the MONITORING_OUTPUT_FORMAT environment variable.
+Without pyarrow, Parquet output falls back to CSV with a warning.
+
+Usage:
+    from _output import write_output
+
+    write_output(df, os.path.join(output_dir, "odp-status.csv"))
+"""
+
+import os
+import pandas as pd
+from _telemetry import record_output
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+OUTPUT_FORMATS = ("csv", "parquet", "both")
+OUTPUT_FORMAT = os.environ.get("MONITORING_OUTPUT_FORMAT", "csv")
+PARQUET_COMPRESSION = "zstd"
+
+
+def set_output_format(output_format: str | None) -> None:
+    """
+    Sets the process-wide output format (ignored when None).
+
+    Args:
+        output_format (str): One of OUTPUT_FORMATS.
+    """
+    global OUTPUT_FORMAT
+    if output_format is None:
+        return
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    OUTPUT_FORMAT = output_format
+
+
+def add_format_argument(parser) -> None:
+    """
+    Adds the shared --format option to a script's argument parser.
+
+    Args:
+        parser (argparse.ArgumentParser): The script's parser.
+    """
+    parser.add_argument(
+        "--format",
+        choices=OUTPUT_FORMATS,
+        default=None,
+        help=f"Output file format (default: {OUTPUT_FORMAT})"
+    )
+
+
+def _formats(output_format: str | None) -> tuple[bool, bool]:
+    """Returns (write CSV, write Parquet) for a format, falling back to CSV without pyarrow."""
+    output_format = output_format or OUTPUT_FORMAT
+    csv = output_format in ("csv", "both")
+    parquet = output_format in ("parquet", "both")
+    if parquet and not PARQUET_AVAILABLE:
+        print("[WARNING] pyarrow not installed, writing CSV instead of Parquet")
+        return True, False
+    return csv, parquet
+
+
+def parquet_path(csv_path: str) -> str:
+    """Returns the Parquet path that goes with a report's CSV path."""
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+
+def _mixed_as_string(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts object columns holding a mix of types (which Arrow cannot store
+    in one column) to strings.
+    """
+    mixed = [
+        col for col in df.columns
+        if df[col].dtype == object
+        and pd.api.types.infer_dtype(df[col], skipna=True) in ("mixed", "mixed-integer")
+    ]
+    return df.astype({col: "string" for col in mixed}) if mixed else df
+
+
+def _to_parquet(df: pd.DataFrame, path: str) -> None:
+    """Writes a DataFrame as compressed Parquet (mixed-type columns as strings)."""
+    _mixed_as_string(df).to_parquet(path, index=False, compression=PARQUET_COMPRESSION)
+
+
+def write_output(df: pd.DataFrame, csv_path: str, output_format: str | None = None) -> list[str]:
+    """
+    Writes a report in the selected output format(s).
+
+    Args:
+        df (pd.DataFrame): Report to write (the index is not written).
+        csv_path (str): Path of the report's CSV; Parquet uses the same name.
+        output_format (str, optional): Overrides the process-wide format.
+
+    Returns:
+        list: Paths of the files written.
+    """
+    csv, parquet = _formats(output_format)
+    written = []
+    if csv:
+        df.to_csv(csv_path, index=False)
+        written.append(csv_path)
+    if parquet:
+        _to_parquet(df, parquet_path(csv_path))
+        written.append(parquet_path(csv_path))
+    for path in written:
+        record_output(path, len(df))
+    return written
+
+
+def read_output(csv_path: str, **read_kwargs) -> pd.DataFrame:
+    """
+    Reads back a report written by write_output, from its CSV when present,
+    otherwise from its Parquet file.
+
+    Args:
+        csv_path (str): Path of the report's CSV.
+        **read_kwargs: usecols is mapped to columns for Parquet; the rest
+            are passed to pd.read_csv only.
+
+    Returns:
+        pd.DataFrame: The report.
+    """
+    if os.path.exists(csv_path) or not os.path.exists(parquet_path(csv_path)):
+        return pd.read_csv(csv_path, **read_kwargs)
+    return pd.read_parquet(parquet_path(csv_path), columns=read_kwargs.get("usecols"))
+
+
+class ChunkedOutput:
+    """
+    Writes a report that is produced in chunks (e.g. while paging through a
+    query) without holding the whole report in memory until the end.
+
+    Chunks are appended to the CSV, and written as row groups of the Parquet
+    file, as they arrive. The Parquet schema is taken from the first chunk
+    (columns with no values in it are typed as strings) and later chunks are
+    converted to it.
+    """
+
+    def __init__(self, csv_path: str, columns: list[str], output_format: str | None = None):
+        self.csv_path = csv_path
+        self.columns = list(columns)
+        self.csv, self.parquet = _formats(output_format)
+        self.rows = 0
+        self._writer = None
+        self._schema = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        df = df[self.columns]
+        if self.csv:
+            df.to_csv(
+                self.csv_path, mode="w" if self.rows == 0 else "a", header=self.rows == 0, index=False
+            )
+        if self.parquet:
+            self._write_parquet(df)
+        self.rows += len(df)
+
+    def _write_parquet(self, df: pd.DataFrame) -> None:
+        df = _mixed_as_string(df)
+        if self._schema is not None:
+            # Values in a column the first chunk stored as text are written as text
+            text = [
+                f.name for f in self._schema
+                if pa.types.is_string(f.type) and pd.api.types.infer_dtype(df[f.name], skipna=True) != "string"
+            ]
+            if text:
+                df = df.astype({col: "string" for col in text})
+        table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+        if self._writer is None:
+            self._schema = pa.schema(
+                [pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f for f in table.schema],
+                metadata=table.schema.metadata,
+            )
+            table = table.cast(self._schema)
+            self._writer = pq.ParquetWriter(
+                parquet_path(self.csv_path), self._schema, compression=PARQUET_COMPRESSION
+            )
+        self._writer.write_table(table)
+
+    def close(self) -> list[str]:
+        """
+        Finishes the report.
+
+        Returns:
+            list: Paths of the files written.
+        """
+        written = []
+        if self.csv:
+            if self.rows == 0:
+                pd.DataFrame(columns=self.columns).to_csv(self.csv_path, index=False)
+            written.append(self.csv_path)
+        if self.parquet:
+            if self._writer is None:
+                _to_parquet(pd.DataFrame(columns=self.columns), parquet_path(self.csv_path))
+            else:
+                self._writer.close()
+                self._writer = None
+            written.append(parquet_path(self.csv_path))
+        for path in written:
+            record_output(path, self.rows)
+        return written
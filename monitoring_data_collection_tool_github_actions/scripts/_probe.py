@@ -0,0 +1,184 @@
+"""
+Concurrent URL probing engine.
+
+Runs a probe function (e.g. a classifier that makes HTTP requests) over many
+URLs on a thread pool, with:
+- a cap on concurrent requests per host, so one council server is not hit
+  by every worker at once
+- a global time budget, after which unfinished URLs get a default result
+  instead of holding up the workflow
+- results returned in the same order as the input URLs
+
+It also provides a small SQLite cache of probe results keyed by URL, so URLs
+probed recently can skip the network entirely.
+"""
+
+import os
+import time
+import sqlite3
+from collections import deque
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_PER_HOST = 2
+
+
+def _host(url: str) -> str:
+    try:
+        return urlsplit(url).netloc.lower()
+    except ValueError:
+        return ""
+
+
+def run_probes(urls, probe, default=None, max_workers=DEFAULT_MAX_WORKERS,
+               per_host=DEFAULT_PER_HOST, time_budget=None) -> list:
+    """
+    Calls probe(url) for every URL concurrently.
+
+    Args:
+        urls (list): URLs to probe.
+        probe (callable): Function taking a URL and returning its result.
+        default: Result used for URLs not finished within the time budget,
+            or whose probe raised an exception.
+        max_workers (int): Total concurrent probes.
+        per_host (int): Concurrent probes allowed against the same host.
+        time_budget (float, optional): Seconds allowed for the whole batch.
+
+    Returns:
+        list: One result per input URL, in input order.
+    """
+    urls = list(urls)
+    if not urls:
+        return []
+
+    max_workers, per_host = max(1, max_workers), max(1, per_host)
+    deadline = time.monotonic() + time_budget if time_budget is not None else None
+
+    # URLs are queued per host and only handed to the pool while their host
+    # has a free slot, so no worker ever sits blocked waiting for a busy host
+    pending = {}
+    for i, url in enumerate(urls):
+        pending.setdefault(_host(url), deque()).append(i)
+    active = dict.fromkeys(pending, 0)
+    # Hosts with queued URLs and a free slot, served in turn
+    ready = deque(pending)
+    in_flight = {}
+    results = [default] * len(urls)
+
+    def run_one(url):
+        try:
+            return probe(url)
+        except Exception:
+            return default
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        while ready or in_flight:
+            # Nothing new is started once the budget is spent
+            while ready and len(in_flight) < max_workers and (
+                deadline is None or time.monotonic() < deadline
+            ):
+                host = ready.popleft()
+                i = pending[host].popleft()
+                in_flight[executor.submit(run_one, urls[i])] = (i, host)
+                active[host] += 1
+                if pending[host] and active[host] < per_host:
+                    ready.append(host)
+
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                i, host = in_flight.pop(future)
+                results[i] = future.result()
+                active[host] -= 1
+                # The host just got a free slot back
+                if pending[host] and active[host] == per_host - 1:
+                    ready.append(host)
+
+        unchecked = len(in_flight) + sum(len(q) for q in pending.values())
+        if unchecked:
+            print(f"[WARNING] Probe time budget exceeded: {unchecked} of {len(urls)} URL(s) not checked")
+        return results
+    finally:
+        # Do not wait for probes still in flight once the budget is spent
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Persistent probe-result cache
+def open_probe_cache(path: str) -> sqlite3.Connection:
+    """
+    Opens (creating if needed) the SQLite cache of probe results.
+
+    Args:
+        path (str): Path of the SQLite file (e.g. in the snapshot directory).
+
+    Returns:
+        sqlite3.Connection: Open connection to the cache.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS probe_result (
+            url TEXT PRIMARY KEY,
+            status INTEGER,
+            content_type TEXT,
+            "group" TEXT,
+            details TEXT,
+            checked_at REAL NOT NULL
+        )
+        """
+    )
+    return conn
+
+
+def get_cached_probes(conn: sqlite3.Connection, urls, ttl_hours: float) -> dict:
+    """
+    Looks up cached probe results that are younger than the TTL.
+
+    Args:
+        conn (sqlite3.Connection): Open cache connection.
+        urls (list): URLs to look up.
+        ttl_hours (float): Maximum age of a usable result, in hours.
+
+    Returns:
+        dict: URL -> {"status", "content_type", "group", "details"} for cache hits.
+    """
+    oldest = time.time() - ttl_hours * 3600
+    urls = list(urls)
+    hits = {}
+    # SQLite limits the number of bound parameters per statement
+    for i in range(0, len(urls), 500):
+        batch = urls[i:i + 500]
+        placeholders = ", ".join("?" * len(batch))
+        rows = conn.execute(
+            f'SELECT url, status, content_type, "group", details FROM probe_result '
+            f"WHERE checked_at >= ? AND url IN ({placeholders})",
+            [oldest, *batch],
+        )
+        for url, status, content_type, group, details in rows:
+            hits[url] = {"status": status, "content_type": content_type, "group": group, "details": details}
+    return hits
+
+
+def store_probes(conn: sqlite3.Connection, results: dict) -> None:
+    """
+    Saves probe results, replacing any older entry for the same URL.
+
+    Args:
+        conn (sqlite3.Connection): Open cache connection.
+        results (dict): URL -> {"status", "content_type", "group", "details"}.
+    """
+    now = time.time()
+    with conn:
+        conn.executemany(
+            'INSERT OR REPLACE INTO probe_result (url, status, content_type, "group", details, checked_at) '
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (url, r.get("status"), r.get("content_type"), r.get("group"), r.get("details"), now)
+                for url, r in results.items()
+            ],
+        )
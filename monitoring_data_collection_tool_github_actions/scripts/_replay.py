@@ -0,0 +1,189 @@
+"""
+Record / replay of HTTP responses, so the scripts can run offline against
+fixtures (used by benchmark.py).
+
+Enabled by an environment variable read when _datasette.py is imported:
+- DATASETTE_REPLAY=record:<dir>  requests go to the network as usual and every
+  response body is saved under <dir>
+- DATASETTE_REPLAY=replay:<dir>  requests are answered from <dir>; a request
+  that was never recorded fails like a network error
+
+The recorder is injected as the transport of every requests session in the
+process (the pooled Datasette session and one-off requests.get calls alike),
+so scripts and their parsing code run unchanged.
+
+DATASETTE_REPLAY_SCALE=<n> replays each JSON / CSV response with its rows
+repeated n times, as a synthetic n-times larger service:
+- copies 2..n have '~<copy>' appended to their text values (dates, numbers,
+  empty and JSON values are kept), so each copy only joins with itself
+- the original rows come last, so keyset pagination asks for the recorded
+  next page, and a page past the recorded ones is answered with an empty
+  JSON array
+Numeric ids are repeated as they are, so joins on them grow faster than n.
+
+Usage:
+    DATASETTE_REPLAY=record:fixtures python scripts/generate_odp_status_csv.py --output-dir outputs
+    DATASETTE_REPLAY=replay:fixtures python scripts/generate_odp_status_csv.py --output-dir outputs
+"""
+
+import io
+import os
+import re
+import csv
+import json
+import uuid
+import hashlib
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+
+REPLAY_ENV = "DATASETTE_REPLAY"
+SCALE_ENV = "DATASETTE_REPLAY_SCALE"
+MODES = ("record", "replay")
+
+# Headers that describe the wire encoding; bodies are stored decoded
+WIRE_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+# Text values that are kept as they are in scaled copies
+UNSCALED_TEXT = re.compile(r"^\s*$|^-?\d+(\.\d+)?$|^\d{4}-\d{2}-\d{2}|^[\[{]")
+
+_original_send = HTTPAdapter.send
+_installed = None
+
+
+def fixture_key(request) -> str:
+    """Returns the file name stem of a request's fixture."""
+    return hashlib.sha1(f"{request.method} {request.url}".encode("utf-8")).hexdigest()
+
+
+def save_fixture(fixture_dir: str, request, status: int, headers: dict, body: bytes) -> None:
+    """Saves one response (metadata as JSON, body as raw bytes), atomically."""
+    os.makedirs(fixture_dir, exist_ok=True)
+    stem = os.path.join(fixture_dir, fixture_key(request))
+    meta = {"method": request.method, "url": request.url, "status": status, "headers": headers}
+    for path, data in ((stem + ".body", body), (stem + ".json", json.dumps(meta, indent=1).encode("utf-8"))):
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+def load_fixture(fixture_dir: str, request) -> tuple[int, dict, bytes] | None:
+    """Returns (status, headers, body) of a recorded request, or None."""
+    stem = os.path.join(fixture_dir, fixture_key(request))
+    try:
+        with open(stem + ".json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(stem + ".body", "rb") as f:
+            body = f.read()
+    except FileNotFoundError:
+        return None
+    return meta["status"], meta["headers"], body
+
+
+# Synthetic scaling
+def _scale_value(value, copy: int):
+    if isinstance(value, str) and not UNSCALED_TEXT.match(value):
+        return f"{value}~{copy}"
+    return value
+
+
+def _scale_rows(rows: list, scale: int) -> list:
+    """Repeats rows (dicts or lists) scale times, originals last."""
+    scaled = []
+    for copy in range(2, scale + 1):
+        for row in rows:
+            if isinstance(row, dict):
+                scaled.append({k: _scale_value(v, copy) for k, v in row.items()})
+            elif isinstance(row, list):
+                scaled.append([_scale_value(v, copy) for v in row])
+            else:
+                scaled.append(row)
+    return scaled + rows
+
+
+def scale_body(body: bytes, content_type: str, url: str, scale: int) -> bytes:
+    """
+    Returns a JSON or CSV body with its rows repeated scale times (see the
+    module docstring); other bodies are returned unchanged.
+    """
+    if scale <= 1 or not body:
+        return body
+    path = url.split("?", 1)[0]
+    if "json" in content_type or path.endswith(".json"):
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return body
+        if isinstance(data, list):
+            data = _scale_rows(data, scale)
+        elif isinstance(data, dict) and isinstance(data.get("rows"), list):
+            data["rows"] = _scale_rows(data["rows"], scale)
+        return json.dumps(data).encode("utf-8")
+    if "csv" in content_type or path.endswith(".csv"):
+        text = body.decode("utf-8")
+        rows = list(csv.reader(io.StringIO(text)))
+        if len(rows) < 2:
+            return body
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(rows[0])
+        writer.writerows(_scale_rows(rows[1:], scale))
+        return out.getvalue().encode("utf-8")
+    return body
+
+
+# Transport
+def _build_response(adapter: HTTPAdapter, request, status: int, headers: dict, body: bytes):
+    headers = {**headers, "Content-Length": str(len(body))}
+    raw = HTTPResponse(
+        body=io.BytesIO(body), headers=headers, status=status, preload_content=False, decode_content=False
+    )
+    return adapter.build_response(request, raw)
+
+
+def _recording_send(self, request, **kwargs):
+    response = _original_send(self, request, **kwargs)
+    body = response.raw.read(decode_content=True)
+    headers = {k: v for k, v in response.headers.items() if k.lower() not in WIRE_HEADERS}
+    save_fixture(_installed["dir"], request, response.status_code, headers, body)
+    response.close()
+    return _build_response(self, request, response.status_code, headers, body)
+
+
+def _replaying_send(self, request, **kwargs):
+    fixture = load_fixture(_installed["dir"], request)
+    scale = _installed["scale"]
+    if fixture is None:
+        # A keyset page past the recorded ones, reached because of scaling
+        if scale > 1 and "_shape=array" in request.url:
+            return _build_response(self, request, 200, {"Content-Type": "application/json"}, b"[]")
+        raise requests.ConnectionError(f"No recorded response for {request.method} {request.url}", request=request)
+    status, headers, body = fixture
+    content_type = next((v for k, v in headers.items() if k.lower() == "content-type"), "")
+    return _build_response(self, request, status, headers, scale_body(body, content_type, request.url, scale))
+
+
+def install(mode: str, fixture_dir: str, scale: int = 1) -> None:
+    """
+    Injects the recording or replaying transport into every requests
+    session of this process.
+
+    Args:
+        mode (str): 'record' or 'replay'.
+        fixture_dir (str): Directory holding the fixtures.
+        scale (int): Row multiplier applied when replaying.
+    """
+    global _installed
+    if mode not in MODES:
+        raise ValueError(f"Unknown replay mode: {mode}")
+    _installed = {"mode": mode, "dir": os.path.abspath(fixture_dir), "scale": max(1, int(scale))}
+    HTTPAdapter.send = _recording_send if mode == "record" else _replaying_send
+
+
+def install_from_env() -> None:
+    """Installs record / replay when DATASETTE_REPLAY is set (see module docstring)."""
+    setting = os.environ.get(REPLAY_ENV)
+    if not setting or _installed is not None:
+        return
+    mode, _, fixture_dir = setting.partition(":")
+    install(mode, fixture_dir or "fixtures", int(os.environ.get(SCALE_ENV, "1")))
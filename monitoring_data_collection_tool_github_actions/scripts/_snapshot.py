@@ -0,0 +1,190 @@
+"""
+Run-scoped on-disk snapshot cache for full Datasette tables.
+
+Scripts that need a whole table (e.g. digital-land/endpoint) call
+get_snapshot() instead of streaming the CSV themselves. The first call in a
+run downloads the table and stores it on disk; later calls in the same run
+(identified by the DATASETTE_RUN_ID environment variable, set by run.py) are
+served from disk without touching the network. On the next run the stored
+ETag / Last-Modified values are sent back so an unchanged table is not
+downloaded again.
+
+Snapshots are written as Parquet when pyarrow is installed, otherwise pickle.
+The cache folder defaults to '.snapshots' next to run.py and can be moved
+with the DATASETTE_SNAPSHOT_DIR environment variable.
+
+Usage (warm a snapshot ahead of the scripts that need it):
+    python scripts/_snapshot.py digital-land/endpoint digital-land/source
+"""
+
+import os
+import sys
+import json
+import uuid
+import datetime
+import argparse
+import pandas as pd
+from _datasette import DATASETTE_URL, REQUEST_TIMEOUT, get_datasette_http
+
+try:
+    import pyarrow  # noqa: F401
+    SNAPSHOT_FORMAT = "parquet"
+except ImportError:
+    SNAPSHOT_FORMAT = "pickle"
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_DIR = os.environ.get(
+    "DATASETTE_SNAPSHOT_DIR", os.path.abspath(os.path.join(SCRIPT_DIR, "..", ".snapshots"))
+)
+
+# Scripts run outside run.py get their own run ID, so they always revalidate
+RUN_ID = os.environ.get("DATASETTE_RUN_ID") or uuid.uuid4().hex
+
+
+def _snapshot_stem(db: str, table: str) -> str:
+    """
+    Returns the snapshot file path without extension.
+
+    Args:
+        db (str): Datasette database name.
+        table (str): Table name.
+
+    Returns:
+        str: Path shared by the data file and its '.json' metadata.
+    """
+    return os.path.join(SNAPSHOT_DIR, f"{db}__{table}")
+
+
+def _read_meta(meta_path: str) -> dict:
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(meta_path: str, meta: dict) -> None:
+    tmp_path = f"{meta_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, meta_path)
+
+
+def _load_frame(meta: dict, data_path: str) -> pd.DataFrame:
+    if meta.get("format", SNAPSHOT_FORMAT) == "parquet":
+        return pd.read_parquet(data_path)
+    return pd.read_pickle(data_path)
+
+
+def _save_frame(df: pd.DataFrame, db: str, table: str) -> tuple[str, str]:
+    """
+    Writes a snapshot atomically, falling back to pickle when a column
+    cannot be stored as Parquet (e.g. mixed types inferred by read_csv).
+
+    Returns:
+        tuple: (format used, path written).
+    """
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    stem = _snapshot_stem(db, table)
+    tmp_suffix = f".{uuid.uuid4().hex}.tmp"
+    if SNAPSHOT_FORMAT == "parquet":
+        try:
+            df.to_parquet(stem + ".parquet" + tmp_suffix, index=False)
+            os.replace(stem + ".parquet" + tmp_suffix, stem + ".parquet")
+            return "parquet", stem + ".parquet"
+        except Exception:
+            if os.path.exists(stem + ".parquet" + tmp_suffix):
+                os.remove(stem + ".parquet" + tmp_suffix)
+    df.to_pickle(stem + ".pickle" + tmp_suffix)
+    os.replace(stem + ".pickle" + tmp_suffix, stem + ".pickle")
+    return "pickle", stem + ".pickle"
+
+
+def get_snapshot(db: str, table: str, url=DATASETTE_URL) -> pd.DataFrame:
+    """
+    Returns a full Datasette table, downloading it at most once per run.
+
+    Args:
+        db (str): Datasette database name (e.g. 'digital-land').
+        table (str): Table name (e.g. 'endpoint').
+        url (str): Base URL of the Datasette instance.
+
+    Returns:
+        pd.DataFrame: The full table, as pd.read_csv would have parsed it.
+
+    Raises:
+        requests.HTTPError: If the table cannot be downloaded and no snapshot exists.
+    """
+    meta_path = _snapshot_stem(db, table) + ".json"
+    meta = _read_meta(meta_path)
+    stored_path = meta.get("path")
+    have_snapshot = bool(stored_path) and os.path.exists(stored_path)
+
+    # Already fetched or revalidated during this run
+    if have_snapshot and meta.get("run_id") == RUN_ID:
+        return _load_frame(meta, stored_path)
+
+    headers = {}
+    if have_snapshot:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    full_url = f"{url}/{db}/{table}.csv?_stream=on"
+    with get_datasette_http().get(full_url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as response:
+        if response.status_code == 304 and have_snapshot:
+            print(f"[SNAPSHOT] {db}/{table} unchanged, using {stored_path}")
+            meta["run_id"] = RUN_ID
+            _write_meta(meta_path, meta)
+            return _load_frame(meta, stored_path)
+
+        response.raise_for_status()
+        response.raw.decode_content = True
+        df = pd.read_csv(response.raw)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+
+    fmt, saved_path = _save_frame(df, db, table)
+    _write_meta(meta_path, {
+        "db": db,
+        "table": table,
+        "format": fmt,
+        "path": saved_path,
+        "etag": etag,
+        "last_modified": last_modified,
+        "run_id": RUN_ID,
+        "rows": len(df),
+        "fetched_at": datetime.datetime.now().isoformat(timespec="seconds"),
+    })
+    print(f"[SNAPSHOT] {db}/{table} downloaded ({len(df)} rows) to {saved_path}")
+    return df
+
+
+def parse_args():
+    """
+    Parses the list of tables to warm.
+
+    Returns:
+        argparse.Namespace: Parsed args containing 'db/table' names.
+    """
+    parser = argparse.ArgumentParser(description="Warm Datasette table snapshots")
+    parser.add_argument(
+        "tables",
+        nargs="+",
+        help="Tables to snapshot, as db/table (e.g. digital-land/endpoint)"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    failed = False
+    for name in args.tables:
+        db, _, table = name.partition("/")
+        try:
+            get_snapshot(db, table)
+        except Exception as e:
+            print(f"[ERROR] Failed to snapshot {name}: {e}")
+            failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,121 @@
+"""
+Compiled cache of the dataset -> fields mapping from the specification.
+
+documentation/utils/specification.csv stores each specification as a JSON
+blob. Parsing it is only done when the file changes: the compiled mapping is
+pickled into the snapshot folder (see _snapshot.py) under a name that
+includes the source file's hash and the cache format version, so a new
+specification.csv or a change to the compiled format invalidates it.
+
+Usage:
+    from _specification import get_dataset_fields, get_dataset_field_df
+
+    get_dataset_fields()["tree"]   # ('reference', 'name', ...)
+    get_dataset_field_df()         # one row per dataset/field
+"""
+
+import os
+import json
+import uuid
+import pickle
+import hashlib
+import pandas as pd
+from _snapshot import SNAPSHOT_DIR
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SPEC_PATH = os.path.abspath(os.path.join(SCRIPT_DIR, "..", "documentation", "utils", "specification.csv"))
+
+# Bump when the compiled layout changes
+CACHE_VERSION = 1
+
+_compiled = {}
+
+
+def _file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _compile(spec_path: str) -> list[tuple[str, str]]:
+    """
+    Parses the specification CSV into (dataset, field) pairs, in file order.
+
+    Args:
+        spec_path (str): Path to specification.csv.
+
+    Returns:
+        list: (dataset, field) tuples.
+    """
+    specification_df = pd.read_csv(spec_path, usecols=["json"])
+    rows = []
+    for blob in specification_df["json"]:
+        for spec in json.loads(blob):
+            rows.extend((spec["dataset"], field["field"]) for field in spec["fields"])
+    return rows
+
+
+def _load_rows(spec_path: str = SPEC_PATH) -> list[tuple[str, str]]:
+    """
+    Returns the compiled (dataset, field) pairs, from memory, the on-disk
+    cache, or by compiling the source file (and caching the result).
+    """
+    source_hash = _file_hash(spec_path)
+    if source_hash in _compiled:
+        return _compiled[source_hash]
+
+    cache_path = os.path.join(SNAPSHOT_DIR, f"specification.v{CACHE_VERSION}.{source_hash[:16]}.pickle")
+    rows = None
+    try:
+        with open(cache_path, "rb") as f:
+            cached = pickle.load(f)
+        if cached.get("version") == CACHE_VERSION and cached.get("source_hash") == source_hash:
+            rows = cached["rows"]
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, KeyError):
+        rows = None
+
+    if rows is None:
+        rows = _compile(spec_path)
+        try:
+            os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+            tmp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(
+                    {"version": CACHE_VERSION, "source_hash": source_hash, "rows": rows},
+                    f,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"[WARNING] Could not write specification cache: {e}")
+
+    _compiled[source_hash] = rows
+    return rows
+
+
+def get_dataset_fields(spec_path: str = SPEC_PATH) -> dict[str, tuple[str, ...]]:
+    """
+    Returns the specification fields of every dataset as a lookup dict.
+
+    Args:
+        spec_path (str): Path to specification.csv.
+
+    Returns:
+        dict: Dataset name -> tuple of field names, in specification order.
+    """
+    fields = {}
+    for dataset, field in _load_rows(spec_path):
+        fields.setdefault(dataset, []).append(field)
+    return {dataset: tuple(values) for dataset, values in fields.items()}
+
+
+def get_dataset_field_df(spec_path: str = SPEC_PATH) -> pd.DataFrame:
+    """
+    Returns the specification fields as a DataFrame.
+
+    Args:
+        spec_path (str): Path to specification.csv.
+
+    Returns:
+        pd.DataFrame: Each row represents a dataset/field combination.
+    """
+    return pd.DataFrame(_load_rows(spec_path), columns=["dataset", "field"])
@@ -0,0 +1,140 @@
+"""
+Per-script resource telemetry collected for run.py.
+
+Counts, for the current process:
+- CPU time (user + system) and peak resident memory
+- HTTP requests made and response bytes received on the wire (before
+  decompression), through the shared Datasette session or any request
+  passed count_response as a hook
+- rows written per output file (recorded by _output.py)
+
+run.py sets MONITORING_TELEMETRY_FILE when it starts a script; the counters
+are then written to that file as JSON when the script exits. In-process
+workers call reset() before each script and write_report() after it.
+
+Usage:
+    from _telemetry import count_response, record_output
+
+    requests.get(url, hooks={"response": count_response})
+    record_output(path, len(df))
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TELEMETRY_FILE_ENV = "MONITORING_TELEMETRY_FILE"
+
+_lock = threading.Lock()
+_stats = {}
+_cpu_start = 0.0
+
+
+def _reset_peak_rss() -> None:
+    """Resets the kernel's peak RSS counter (Linux only, ignored elsewhere)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb() -> float | None:
+    """
+    Returns the peak resident memory of this process in MB (since the last
+    reset() on Linux), or None when it cannot be measured.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KB elsewhere
+    return round(maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def reset() -> None:
+    """Starts counting from zero (called per script by in-process workers)."""
+    global _stats, _cpu_start
+    with _lock:
+        _stats = {"http_requests": 0, "http_bytes": 0, "outputs": {}}
+        _cpu_start = time.process_time()
+    _reset_peak_rss()
+
+
+def _add_bytes(count: int) -> None:
+    with _lock:
+        _stats["http_bytes"] += count
+
+
+def count_response(response, *args, **kwargs):
+    """
+    requests response hook: counts the request, and the body bytes received
+    on the wire (before gzip decoding) as they are read, streamed responses
+    included, without reading the body itself.
+    """
+    with _lock:
+        _stats["http_requests"] += 1
+
+    raw = response.raw
+    read, handle_chunk = raw.read, getattr(raw, "_handle_chunk", None)
+
+    def counted_read(*read_args, **read_kwargs):
+        start = raw.tell()
+        data = read(*read_args, **read_kwargs)
+        _add_bytes(raw.tell() - start)
+        return data
+
+    # urllib3 does not advance tell() for chunked bodies; count each raw chunk
+    def counted_handle_chunk(*chunk_args, **chunk_kwargs):
+        chunk = handle_chunk(*chunk_args, **chunk_kwargs)
+        _add_bytes(len(chunk))
+        return chunk
+
+    raw.read = counted_read
+    if handle_chunk is not None:
+        raw._handle_chunk = counted_handle_chunk
+    return response
+
+
+def record_output(path: str, rows: int) -> None:
+    """Records the number of rows written to an output file."""
+    with _lock:
+        _stats["outputs"][os.path.basename(path)] = int(rows)
+
+
+def snapshot() -> dict:
+    """
+    Returns:
+        dict: cpu_seconds, peak_rss_mb, http_requests, http_bytes and
+        outputs (file name -> rows) since the last reset().
+    """
+    with _lock:
+        stats = {**_stats, "outputs": dict(_stats["outputs"])}
+        cpu_seconds = time.process_time() - _cpu_start
+    return {"cpu_seconds": round(cpu_seconds, 2), "peak_rss_mb": peak_rss_mb(), **stats}
+
+
+def write_report(path: str) -> None:
+    """Writes snapshot() to path as JSON."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f)
+
+
+reset()
+
+if os.environ.get(TELEMETRY_FILE_ENV):
+    atexit.register(write_report, os.environ[TELEMETRY_FILE_ENV])
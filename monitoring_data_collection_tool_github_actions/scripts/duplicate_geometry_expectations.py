@@ -1,75 +1,175 @@
 import pandas as pd
 import ast
+import json
 import argparse
 import os
-
-# Load expectations table
-url = "https://datasette.planning.data.gov.uk/digital-land/expectation.csv?_stream=on"
-df = pd.read_csv(url)
-df = df[df["operation"] == "duplicate_geometry_check"]
+from concurrent.futures import ThreadPoolExecutor
+from _datasette import POOL_SIZE, get_datasette_json, read_datasette_csv
+from _output import add_format_argument, set_output_format, write_output
+
+# run.py delta reports: the columns identifying a row of each output
+DELTA_KEYS = {"duplicate_entity_expectation.csv": ["dataset", "message", "entity_a", "entity_b"]}
+
+EXPECTATION_URL = "https://datasette.planning.data.gov.uk/digital-land/expectation.csv?_stream=on"
+
+# details keys holding match lists, and the message each is reported under
+MATCH_TYPES = {"complete_matches": "complete_match", "single_matches": "single_match"}
+MATCH_FIELDS = ["entity_a", "organisation_entity_a", "entity_b", "organisation_entity_b"]
+
+# Datasets whose entities are joined onto the matches (one Datasette database each)
+ENTITY_DATASETS = [
+    "conservation-area",
+    "article-4-direction-area",
+    "listed-building-outline",
+    "tree-preservation-zone",
+    "tree",
+]
+ENTITY_FIELDS = ["entity", "end_date", "entry_date", "geometry", "name", "organisation_entity"]
+ENTITY_BATCH_SIZE = 500  # ids per query; Datasette returns at most 1000 rows
+ENTITY_WORKERS = 4
+
+def load_expectations():
+    """
+    Loads the duplicate geometry rows of the expectation table. Called from
+    main() so that importing the module or asking for --help downloads nothing.
+
+    Returns:
+        pd.DataFrame: Expectation rows with operation 'duplicate_geometry_check'.
+    """
+    df = read_datasette_csv(EXPECTATION_URL, usecols=["dataset", "operation", "details"])
+    return df[df["operation"] == "duplicate_geometry_check"].reset_index(drop=True)
 
 # Parse 'details' column
 def parse_details(val):
-    try:
-        return ast.literal_eval(val)
-    except Exception:
+    """Parses one details blob as JSON, falling back to a Python literal."""
+    if not isinstance(val, str):
         return {}
+    try:
+        parsed = json.loads(val)
+    except ValueError:
+        try:
+            parsed = ast.literal_eval(val)
+        except Exception:
+            return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+def parse_details_column(values):
+    """
+    Parses a column of details blobs. When every blob is JSON the column is
+    decoded with a single json.loads call; otherwise each value is parsed on
+    its own with parse_details.
+
+    Returns:
+        pd.Series: Parsed dicts (empty for unparseable values), same index.
+    """
+    if values.map(lambda v: isinstance(v, str)).all():
+        try:
+            parsed = json.loads("[" + ",".join(values) + "]")
+            if len(parsed) == len(values) and all(isinstance(p, dict) for p in parsed):
+                return pd.Series(parsed, index=values.index, dtype=object)
+        except ValueError:
+            pass
+    return values.map(parse_details)
+
+def extract_matches(df):
+    """
+    Flattens the match lists in each row's details into one row per match,
+    keeping row order, with complete matches before single matches.
+
+    Returns:
+        pd.DataFrame: dataset, operation, message and the MATCH_FIELDS columns.
+    """
+    parsed = parse_details_column(df["details"])
+    frames = []
+    for order, (key, message) in enumerate(MATCH_TYPES.items()):
+        matches = pd.DataFrame({
+            "row": df.index,
+            "order": order,
+            "dataset": df["dataset"],
+            "operation": df["operation"],
+            "message": message,
+            "match": parsed.str.get(key),
+        }).explode("match").dropna(subset=["match"])
+        frames.append(matches)
+
+    matches = pd.concat(frames).sort_values(["row", "order"], kind="stable")
+    fields = pd.DataFrame.from_records(
+        [m if isinstance(m, dict) else {} for m in matches["match"]], columns=MATCH_FIELDS
+    )
+    return pd.concat(
+        [matches[["dataset", "operation", "message"]].reset_index(drop=True), fields],
+        axis=1,
+    )
 
-def main(output_dir):
-    df["details_parsed"] = df["details"].apply(parse_details)
-
+def load_full_entities():
+    """
+    Downloads the full entity table of every dataset in ENTITY_DATASETS.
+
+    Returns:
+        pd.DataFrame: The ENTITY_FIELDS columns plus dataset.
+    """
+    entity_tables = []
+    for dataset_name in ENTITY_DATASETS:
+        df_entity = read_datasette_csv(f"{dataset_name}/entity.csv?_stream=on", usecols=ENTITY_FIELDS)
+        entity_tables.append(df_entity.assign(dataset=dataset_name))
+    return pd.concat(entity_tables, ignore_index=True)
+
+def fetch_entity_batch(dataset, entities):
+    """
+    Fetches the given entities of one dataset with a single IN query.
+
+    Args:
+        dataset (str): Dataset (Datasette database) name.
+        entities (list): Entity numbers, at most ENTITY_BATCH_SIZE.
+
+    Returns:
+        pd.DataFrame: The ENTITY_FIELDS columns plus dataset.
+    """
+    sql = f"""
+        SELECT {", ".join(ENTITY_FIELDS)}
+        FROM entity
+        WHERE entity IN ({", ".join(str(int(e)) for e in entities)})
+    """
+    rows = get_datasette_json(dataset, sql, {"_shape": "array", "_size": "max"})
+    return pd.DataFrame(rows, columns=ENTITY_FIELDS).assign(dataset=dataset)
+
+def load_matched_entities(df_matches):
+    """
+    Fetches only the entities referenced by the matches, in batched IN
+    queries run concurrently across datasets.
+
+    Args:
+        df_matches (pd.DataFrame): Matches with dataset, entity_a and entity_b.
+
+    Returns:
+        pd.DataFrame: The ENTITY_FIELDS columns plus dataset.
+    """
+    batches = []
+    for dataset_name in ENTITY_DATASETS:
+        in_dataset = df_matches[df_matches["dataset"] == dataset_name]
+        entities = pd.concat([in_dataset["entity_a"], in_dataset["entity_b"]]).dropna().astype("int64").unique()
+        entities.sort()
+        batches.extend(
+            (dataset_name, entities[i:i + ENTITY_BATCH_SIZE])
+            for i in range(0, len(entities), ENTITY_BATCH_SIZE)
+        )
+    print(f"Fetching matched entities in {len(batches)} batch(es)")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(ENTITY_WORKERS, POOL_SIZE))) as executor:
+        frames = list(executor.map(lambda batch: fetch_entity_batch(*batch), batches))
+    if not frames:
+        return pd.DataFrame(columns=[*ENTITY_FIELDS, "dataset"]).astype({"entity": "int64"})
+    return pd.concat(frames, ignore_index=True)
+
+def main(output_dir, full_entity_tables=False):
     # Extract match records
-    records = []
-    for _, row in df.iterrows():
-        dataset = row["dataset"]
-        operation = row["operation"]
-        details = row["details_parsed"]
-
-        # Complete matches
-        for match in details.get("complete_matches", []):
-            records.append({
-                "dataset": dataset,
-                "operation": operation,
-                "message": "complete_match",
-                "entity_a": match.get("entity_a"),
-                "organisation_entity_a": match.get("organisation_entity_a"),
-                "entity_b": match.get("entity_b"),
-                "organisation_entity_b": match.get("organisation_entity_b"),
-            })
-
-        # Single matches
-        for match in details.get("single_matches", []):
-            records.append({
-                "dataset": dataset,
-                "operation": operation,
-                "message": "single_match",
-                "entity_a": match.get("entity_a"),
-                "organisation_entity_a": match.get("organisation_entity_a"),
-                "entity_b": match.get("entity_b"),
-                "organisation_entity_b": match.get("organisation_entity_b"),
-            })
-
-    df_matches = pd.DataFrame(records)
-
-    # Load entity tables
-    url_map = {
-        "conservation-area": "https://datasette.planning.data.gov.uk/conservation-area/entity.csv?_stream=on",
-        "article-4-direction-area": "https://datasette.planning.data.gov.uk/article-4-direction-area/entity.csv?_stream=on",
-        "listed-building-outline": "https://datasette.planning.data.gov.uk/listed-building-outline/entity.csv?_stream=on",
-        "tree-preservation-zone": "https://datasette.planning.data.gov.uk/tree-preservation-zone/entity.csv?_stream=on",
-        "tree": "https://datasette.planning.data.gov.uk/tree/entity.csv?_stream=on",
-    }
-
-    columns_to_keep = ["entity", "dataset", "end_date", "entry_date", "geometry", "name", "organisation_entity"]
-
-    entity_tables = {}
-    for dataset_name, entity_url in url_map.items():
-        df_entity = pd.read_csv(entity_url)
-        df_entity["dataset"] = dataset_name
-        entity_tables[dataset_name] = df_entity[columns_to_keep].copy()
-
-    # Combine all entity tables
-    df_entities = pd.concat(entity_tables.values(), ignore_index=True)
+    df_matches = extract_matches(load_expectations())
+
+    # Load entity metadata, either just the matched entities or whole tables
+    if full_entity_tables:
+        df_entities = load_full_entities()
+    else:
+        df_entities = load_matched_entities(df_matches)
 
     # Merge entity_a metadata
     df_matches = df_matches.merge(
@@ -110,7 +210,8 @@ def main(output_dir):
     # Save CSVs
     os.makedirs(output_dir, exist_ok=True)
     matches_csv = os.path.join(output_dir, "duplicate_entity_expectation.csv")
-    df_matches.to_csv(matches_csv, index=False)
+    for path in write_output(df_matches, matches_csv):
+        print(f"Saved: {path}")
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Duplicate geometry checker")
@@ -120,9 +221,16 @@ def parse_args():
         required=True,
         help="Directory to save exported CSVs"
     )
+    parser.add_argument(
+        "--full-entity-tables",
+        action="store_true",
+        help="Download whole entity tables instead of only the matched entities"
+    )
+    add_format_argument(parser)
     return parser.parse_args()
 
 # Entry point
 if __name__ == "__main__":
     args = parse_args()
-    main(args.output_dir)
\ No newline at end of file
+    set_output_format(args.format)
+    main(args.output_dir, full_entity_tables=args.full_entity_tables)
\ No newline at end of file
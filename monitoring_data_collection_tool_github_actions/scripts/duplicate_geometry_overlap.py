@@ -0,0 +1,130 @@
+"""
+Script to measure how much the geometries of each duplicate geometry match
+overlap, so reviewers can triage pairs by overlap rather than eyeballing WKT.
+
+Reads duplicate_entity_expectation.csv (written by
+duplicate_geometry_expectations.py) and computes, per pair:
+- intersection_area: shared area in square metres
+- overlap_ratio: intersection area / union area (1 = identical footprints)
+- hausdorff_distance: largest distance, in metres, from a point of either
+  geometry to the other geometry
+
+All metrics are computed on whole geometry arrays with shapely 2, in British
+National Grid (EPSG:27700) so areas and distances are in metres. The result is
+written as GeoParquet with both geometries kept in EPSG:4326.
+
+Requires geopandas (with shapely 2 and pyarrow); the script is skipped with a
+warning when they are not installed.
+
+Usage:
+    python duplicate_geometry_overlap.py --output-dir ./output
+"""
+
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+try:
+    import geopandas as gpd
+    import shapely
+except ImportError:
+    gpd = None
+from _output import add_format_argument, read_output, set_output_format
+from _telemetry import record_output
+
+# run.py scheduling: the matches must have been written first
+DEPENDS_ON = ["duplicate_geometry_expectations.py"]
+
+INPUT_CSV = "duplicate_entity_expectation.csv"
+OUTPUT_FILE = "duplicate_geometry_overlap.parquet"
+SOURCE_CRS = "EPSG:4326"
+METRIC_CRS = "EPSG:27700"
+KEY_COLS = ["dataset", "message", "entity_a", "entity_a_name", "entity_b", "entity_b_name"]
+
+def parse_geometries(wkt):
+    """
+    Parses a column of WKT into a GeoSeries in SOURCE_CRS. Empty or
+    unparseable values become None.
+    """
+    geoms = shapely.from_wkt(wkt.where(wkt.notna(), None).to_numpy(dtype=object), on_invalid="ignore")
+    return gpd.GeoSeries(geoms, index=wkt.index, crs=SOURCE_CRS)
+
+def to_metric(geometries):
+    """Projects a GeoSeries to METRIC_CRS as a valid shapely geometry array."""
+    return shapely.make_valid(np.asarray(geometries.to_crs(METRIC_CRS).values))
+
+def overlap_metrics(geom_a, geom_b):
+    """
+    Computes the overlap metrics of two aligned geometry arrays.
+
+    Args:
+        geom_a (np.ndarray): Geometries of entity_a (projected, in metres).
+        geom_b (np.ndarray): Geometries of entity_b, aligned with geom_a.
+
+    Returns:
+        pd.DataFrame: area_a, area_b, intersection_area, overlap_ratio and
+        hausdorff_distance, one row per pair (NaN where a geometry is missing).
+    """
+    area_a = shapely.area(geom_a)
+    area_b = shapely.area(geom_b)
+    intersection_area = shapely.area(shapely.intersection(geom_a, geom_b))
+    union_area = area_a + area_b - intersection_area
+    with np.errstate(divide="ignore", invalid="ignore"):
+        overlap_ratio = np.where(union_area > 0, intersection_area / union_area, np.nan)
+    return pd.DataFrame({
+        "area_a": area_a,
+        "area_b": area_b,
+        "intersection_area": intersection_area,
+        "overlap_ratio": overlap_ratio,
+        "hausdorff_distance": shapely.hausdorff_distance(geom_a, geom_b),
+    })
+
+def main(output_dir):
+    if gpd is None:
+        print("[WARNING] geopandas/shapely not installed, skipping duplicate geometry overlap metrics")
+        return
+
+    df = read_output(
+        os.path.join(output_dir, INPUT_CSV),
+        usecols=[*KEY_COLS, "entity_a_geometry", "entity_b_geometry"],
+    )
+
+    # Parse and project both sides in bulk
+    geometry_a = parse_geometries(df["entity_a_geometry"])
+    geometry_b = parse_geometries(df["entity_b_geometry"])
+    metrics = overlap_metrics(to_metric(geometry_a), to_metric(geometry_b))
+
+    gdf = gpd.GeoDataFrame(
+        pd.concat([df[KEY_COLS], metrics], axis=1).assign(
+            entity_a_geometry=geometry_a,
+            entity_b_geometry=geometry_b,
+        ),
+        geometry="entity_a_geometry",
+        crs=SOURCE_CRS,
+    )
+
+    # Output
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, OUTPUT_FILE)
+    gdf.to_parquet(output_path, index=False)
+    record_output(output_path, len(gdf))
+    print(f"Saved {len(gdf)} rows to {output_path}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Duplicate geometry overlap metrics")
+    parser.add_argument(
+        "--output-dir",
+        type=str,
+        required=True,
+        help="Directory containing duplicate_entity_expectation.csv and for the GeoParquet output"
+    )
+    # Accepted for consistency with the other scripts; this output is always GeoParquet
+    add_format_argument(parser)
+    return parser.parse_args()
+
+# Entry point
+if __name__ == "__main__":
+    args = parse_args()
+    set_output_format(args.format)
+    main(args.output_dir)
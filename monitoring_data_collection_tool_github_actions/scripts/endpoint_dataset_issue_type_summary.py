@@ -1,6 +1,7 @@
-import pandas as pd
 import os
 import argparse
+from _datasette import read_datasette_csv
+from _output import add_format_argument, set_output_format, write_output
 
 def full_datasette_table(tables, output_dir):
     """
@@ -15,11 +16,11 @@ def full_datasette_table(tables, output_dir):
     for name, url in tables.items():
         full_url = f"{url}.csv?_stream=on"  # Enable full streaming of rows
         try:
-            df = pd.read_csv(full_url)  # Load full dataset
+            df = read_datasette_csv(full_url)  # Load full dataset
             csv_name = f"{name}.csv"
             save_path = os.path.join(output_dir, csv_name)
-            df.to_csv(save_path, index=False)  # Save to CSV without index
-            print(f"Saved: {save_path}")
+            for path in write_output(df, save_path):
+                print(f"Saved: {path}")
         except Exception as e:
             print(f"[ERROR] Failed to fetch {name}: {e}")
 
@@ -37,12 +38,16 @@ def parse_args():
         required=True,
         help="Directory to save exported CSVs"
     )
+    add_format_argument(parser)
     return parser.parse_args()
 
-if __name__ == "__main__":
-    # Parse command-line arguments
-    args = parse_args()
+def main(output_dir):
+    """
+    Exports the endpoint dataset issue type summary table.
 
+    Args:
+        output_dir (str): The directory to save the exported CSV files.
+    """
     # Dictionary of table names and their Datasette URLs
     tables = {
         "endpoint-dataset-issue-type-summary":
@@ -50,4 +55,10 @@ if __name__ == "__main__":
     }
 
     # Run export
-    full_datasette_table(tables, args.output_dir)
+    full_datasette_table(tables, output_dir)
+
+if __name__ == "__main__":
+    # Parse command-line arguments
+    args = parse_args()
+    set_output_format(args.format)
+    main(args.output_dir)
@@ -1,14 +1,19 @@
-import requests
 import pandas as pd
 import os
 import argparse
+from _datasette import get_datasette_keyset_query
+from _output import add_format_argument, set_output_format, write_output
 
-# Constants
-DATASSETTE_URL = "https://datasette.planning.data.gov.uk/digital-land.json"
+# run.py delta reports: the columns identifying a row of each output
+# (the rowids used for paging are dropped from the report, so key on these)
+DELTA_KEYS = {"all-endpoints-and-documentation-urls.csv": ["endpoint", "organisation", "pipeline/dataset"]}
 
 # Base SQL query to retrieve endpoint metadata
+# (source and source_pipeline rowids identify each row for keyset pagination)
 BASE_SQL = """
 SELECT 
+    s.rowid AS source_rowid,
+    sp.rowid AS source_pipeline_rowid,
     o.name,
     s.organisation, 
     sp.pipeline AS "pipeline/dataset", 
@@ -22,8 +27,6 @@ FROM
     INNER JOIN source s ON e.endpoint = s.endpoint
     INNER JOIN source_pipeline sp ON s.source = sp.source
     INNER JOIN organisation o ON o.organisation = s.organisation
-ORDER BY s.entry_date DESC
-LIMIT 1000 OFFSET {offset}
 """
 
 def parse_args():
@@ -37,39 +40,24 @@ def parse_args():
         required=True,
         help="Directory to save the output CSV"
     )
+    add_format_argument(parser)
     return parser.parse_args()
 
 def fetch_endpoint_data():
     """
-    Fetches all endpoint metadata using paginated SQL from Datasette API.
+    Fetches all endpoint metadata using keyset-paginated SQL from Datasette API.
 
     Returns:
-        pd.DataFrame: Combined result of all pages as a DataFrame.
+        pd.DataFrame: Combined result of all pages, newest entry_date first.
     """
-    all_rows, offset = [], 0
-    columns = []
-
-    while True:
-        paginated_sql = BASE_SQL.format(offset=offset)
-        response = requests.get(DATASSETTE_URL, params={"sql": paginated_sql, "_size": 1000})
-
-        if response.status_code != 200:
-            print("Failed to fetch data from Datasette.")
-            break
-
-        json_data = response.json()
-        rows = json_data.get("rows", [])
-
-        if not rows:
-            break
-
-        if offset == 0:
-            columns = json_data.get("columns", [])
-
-        all_rows.extend(rows)
-        offset += 1000
+    df = get_datasette_keyset_query(
+        "digital-land", BASE_SQL, keys=("source_rowid", "source_pipeline_rowid")
+    )
+    if df.empty:
+        return df
 
-    return pd.DataFrame(all_rows, columns=columns) if all_rows else pd.DataFrame()
+    # Pages arrive in key order; restore the newest-first ordering
+    return df.sort_values("entry_date", ascending=False, kind="stable").reset_index(drop=True)
 
 def analyze_missing_docs(df):
     """
@@ -125,14 +113,16 @@ def save_results(df, output_dir):
     os.makedirs(output_dir, exist_ok=True)
     #filtered = df.query("documentation_missing and is_active")
     output_path = os.path.join(output_dir, "all-endpoints-and-documentation-urls.csv")
-    df.to_csv(output_path, index=False)
-    print(f"CSV saved: {output_path}")
+    for path in write_output(df, output_path):
+        print(f"Saved: {path}")
 
-def main():
+def main(output_dir):
     """
     Main workflow to fetch, analyze, and save data.
+
+    Args:
+        output_dir (str): Output directory path.
     """
-    args = parse_args()
     df = fetch_endpoint_data()
 
     if df.empty:
@@ -140,7 +130,9 @@ def main():
         return
 
     df = analyze_missing_docs(df)
-    save_results(df, args.output_dir)
+    save_results(df, output_dir)
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    set_output_format(args.format)
+    main(args.output_dir)
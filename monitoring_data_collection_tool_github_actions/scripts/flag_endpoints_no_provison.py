@@ -1,41 +1,52 @@
-import pandas as pd
 import argparse
 import os
+from _snapshot import get_snapshot
+from _output import add_format_argument, set_output_format, write_output
+
+# run.py scheduling: warm the shared snapshots before this script starts
+DEPENDS_ON = [
+    "snapshot:digital-land/endpoint",
+    "snapshot:digital-land/source",
+    "snapshot:digital-land/organisation",
+    "snapshot:digital-land/resource_endpoint",
+    "snapshot:digital-land/resource_dataset",
+    "snapshot:digital-land/provision",
+]
+
+# run.py delta reports: the columns identifying a row of each output
+DELTA_KEYS = {
+    "flag_endpoints_no_provision.csv": ["endpoint", "organisation", "dataset"],
+    "flag_endpoints_pdf_only.csv": ["endpoint", "organisation", "dataset"],
+}
 
 def endpoint_provisions_check(output_dir, include_pdf):
     # Fetch and filter Endpoint table
-    endpoint_url = "https://datasette.planning.data.gov.uk/digital-land/endpoint.csv?_stream=on"
-    df0 = pd.read_csv(endpoint_url)
+    df0 = get_snapshot("digital-land", "endpoint")
     df0 = df0[df0['end_date'].isna()]  # Keep only active endpoints
     df_endpoint = df0[["endpoint", "end_date", "endpoint_url"]].copy()
 
     # Fetch and process Source table
-    source_url = "https://datasette.planning.data.gov.uk/digital-land/source.csv?_stream=on"
-    df1 = pd.read_csv(source_url)
+    df1 = get_snapshot("digital-land", "source")
     df1["organisation_ref"] = df1["organisation"].str.replace(r"^.*?:", "", regex=True).astype(str)
     df_source = df1[["endpoint", "source", "collection","organisation_ref"]].copy()
 
     # Fetch and filter Organisation table
-    org_url = "https://datasette.planning.data.gov.uk/digital-land/organisation.csv?_stream=on"
-    df2 = pd.read_csv(org_url)
+    df2 = get_snapshot("digital-land", "organisation")
     df2 = df2[df2['end_date'].isna()]
     df2["reference"] = df2["reference"].astype(str)
     df_org = df2[["name", "reference"]].copy()
     df_org.rename(columns={"name": "organisation", "reference": "organisation_ref"}, inplace=True)
 
     # Fetch and deduplicate Resource_endpoint table
-    resource_endpoint_url = "https://datasette.planning.data.gov.uk/digital-land/resource_endpoint.csv?_stream=on"
-    df3 = pd.read_csv(resource_endpoint_url)
+    df3 = get_snapshot("digital-land", "resource_endpoint")
     df_resource_endpoint = df3[["endpoint", "resource"]].drop_duplicates(subset="endpoint", keep="last")
 
     # Fetch and deduplicate Resource_dataset table
-    resource_dataset_url = "https://datasette.planning.data.gov.uk/digital-land/resource_dataset.csv?_stream=on"
-    df4 = pd.read_csv(resource_dataset_url)
+    df4 = get_snapshot("digital-land", "resource_dataset")
     df_resource_dataset = df4[["dataset", "resource"]].drop_duplicates(subset="resource", keep="last")
 
     # Fetch and process Provisions table
-    provisions_url = "https://datasette.planning.data.gov.uk/digital-land/provision.csv?_stream=on"
-    df5 = pd.read_csv(provisions_url)
+    df5 = get_snapshot("digital-land", "provision")
     df5["organisation"] = df5["organisation"].str.replace(r"^.*?:", "", regex=True).astype(str)
     df_provisions = df5[["dataset", "organisation"]].copy()
     df_provisions.rename(columns={"organisation": "organisation_ref"}, inplace=True)
@@ -70,7 +81,7 @@ def endpoint_provisions_check(output_dir, include_pdf):
 
     # Save PDFs separately
     pdf_path = os.path.join(output_dir, "flag_endpoints_pdf_only.csv")
-    df_pdfs.to_csv(pdf_path, index=False)
+    write_output(df_pdfs, pdf_path)
 
     # Save main CSV (either with or without PDFs)
     if include_pdf:
@@ -79,7 +90,7 @@ def endpoint_provisions_check(output_dir, include_pdf):
         final_output = df_non_pdfs
 
     csv_path = os.path.join(output_dir, "flag_endpoints_no_provision.csv")
-    final_output.to_csv(csv_path, index=False)
+    write_output(final_output, csv_path)
 
 def parse_args():
     """
@@ -98,8 +109,20 @@ def parse_args():
         action="store_true",
         help="Include rows where endpoint_url ends in .pdf in main output"
     )
+    add_format_argument(parser)
     return parser.parse_args()
 
+def main(output_dir, include_pdf=True):
+    """
+    Runs the endpoint provision check with the default options.
+
+    Args:
+        output_dir (str): Directory to save exported CSVs.
+        include_pdf (bool): Keep .pdf endpoint URLs in the main output.
+    """
+    endpoint_provisions_check(output_dir, include_pdf=include_pdf)
+
 if __name__ == "__main__":
     args = parse_args()
-    endpoint_provisions_check(args.output_dir, include_pdf=True)
\ No newline at end of file
+    set_output_format(args.format)
+    main(args.output_dir, include_pdf=True)
\ No newline at end of file
@@ -8,107 +8,236 @@ Usage:
 """
 
 import os
+import json
+import time
 import argparse
-import pandas as pd
 import requests
-from io import StringIO
+from _datasette import iter_datasette_keyset_pages
+from _snapshot import SNAPSHOT_DIR, get_snapshot
+from _probe import run_probes, open_probe_cache, get_cached_probes, store_probes
+from _output import ChunkedOutput, add_format_argument, set_output_format
+from _telemetry import count_response
 
-def is_pdf_url(url):
-    """Check if URL points to a PDF by sending a HEAD request and inspecting Content-Type."""
-    try:
-        response = requests.head(url, allow_redirects=True, timeout=5)
-        content_type = response.headers.get("Content-Type", "").lower()
-        return "application/pdf" in content_type
-    except:
-        return False
+# run.py scheduling: warm the shared snapshots before this script starts
+DEPENDS_ON = [
+    "snapshot:digital-land/endpoint",
+    "snapshot:digital-land/resource_endpoint",
+    "snapshot:digital-land/source",
+]
 
-def fetch_text_content(url):
-    """Fetch and return lowercased plain text content of a URL (used for WFS error detection)."""
-    try:
-        r = requests.get(url, timeout=8)
-        if r.status_code == 200:
-            return r.text.lower()
-        return ""
-    except:
-        return ""
+# run.py delta reports: the columns identifying a row of each output
+DELTA_KEYS = {"flagged_failed_resources.csv": ["resource"]}
+
+# Only the headers and the start of each response body are downloaded
+SNIFF_BYTES = 32 * 1024
 
-def classify_issue(row):
+def sniff_url(url):
     """
-    Classify each row by examining the endpoint URL and exception content.
-    Returns a tuple (group, details) with the error category and advice.
+    Fetch a URL once, reading only the headers and the first SNIFF_BYTES of the
+    body, then close the connection. The result is shared by every network
+    classification rule.
+
+    Returns:
+        dict: status, content_type (lowercased), body (bytes prefix), text
+        (lowercased prefix) and truncated (True if the body was cut off).
+        None if the request failed.
     """
-    url = str(row.get("endpoint_url") or "").strip()
-    exc = str(row.get("exception") or "").lower()
+    try:
+        with requests.get(
+            url, stream=True, allow_redirects=True, timeout=8, hooks={"response": count_response}
+        ) as r:
+            body = b""
+            for chunk in r.iter_content(chunk_size=8192):
+                body += chunk
+                if len(body) >= SNIFF_BYTES:
+                    break
+            truncated = len(body) >= SNIFF_BYTES
+            return {
+                "status": r.status_code,
+                "content_type": r.headers.get("Content-Type", "").lower(),
+                "body": body[:SNIFF_BYTES],
+                "text": body[:SNIFF_BYTES].decode(r.encoding or "utf-8", errors="replace").lower(),
+                "truncated": truncated,
+            }
+    except:
+        return None
+
+# Document extensions recognised in endpoint URLs
+EXT_MAP = {
+    ".pdf": "pdf", ".doc": "doc", ".docx": "docx",
+    ".xls": "xls", ".xlsx": "xlsx", ".ppt": "ppt", ".pptx": "pptx"
+}
+
+# Probe engine limits (see _probe.py)
+PROBE_WORKERS = 16
+PROBE_PER_HOST = 2
+PROBE_TIME_BUDGET = 600  # seconds for all network checks
+PROBE_SKIPPED = (None, "not checked - probe time budget exceeded")
+
+# Failed resources still in use, newest first. Paged on (start date, rowid)
+# so the whole backlog is streamed in chunks rather than cut off at a limit.
+FAILED_RESOURCES_SQL = """
+    SELECT
+        dataset, elapsed, r.end_date, r.start_date, exception, r.resource, status,
+        COALESCE(r.start_date, '') AS start_date_key,
+        cr.rowid AS cr_rowid
+    FROM converted_resource cr
+    INNER JOIN resource r ON cr.resource = r.resource
+    WHERE status = 'failed' AND (r.end_date IS NULL OR r.end_date = '')
+"""
+FAILED_RESOURCES_KEYS = ("start_date_key", "cr_rowid")
 
-    ext_map = {
-        ".pdf": "pdf", ".doc": "doc", ".docx": "docx",
-        ".xls": "xls", ".xlsx": "xlsx", ".ppt": "ppt", ".pptx": "pptx"
-    }
+OUTPUT_COLUMNS = [
+    "resource", "source", "collection", "endpoint_url", "group", "details", "recommend_retirement"
+]
 
+# Probe results are cached with the snapshots (kept between daily runs) and
+# reused until they expire; failed requests are not cached, so they are retried
+PROBE_CACHE_FILE = "probe_cache.sqlite"
+PROBE_CACHE_TTL_HOURS = 72
+
+def endpoint_url_of(row):
+    """Normalise the endpoint URL of a row the way the classifier expects."""
+    return str(row.get("endpoint_url") or "").strip()
+
+def classify_by_url(url):
+    """
+    Classify a URL from its text alone (no network calls).
+    Returns (group, details), or None when a network check is needed.
+    """
     if ".zip" in url.lower():
         return ("zipped file", "file needs to be unzipped first")
 
-    for ext, label in ext_map.items():
+    for ext, label in EXT_MAP.items():
         if ext in url.lower():
             if label == "xls":
                 return ("XLS files", "Possible issues with opening xls file")
             return ("active document links", f"{label} file in URL")
 
-    for label in ext_map.values():
+    for label in EXT_MAP.values():
         if f"-{label}" in url.lower():
             if label == "xls":
                 return ("XLS files", "Possible issues with opening xls file")
             return ("active document links", f"{label} inferred from slug")
 
-    if is_pdf_url(url):
-        return ("active document links", "confirmed via Content-Type check")
+    return None
 
-    try:
-        r = requests.get(url, timeout=8)
-        if r.headers.get("Content-Type", "").lower().startswith("application/json"):
-            json_body = r.json()
+def probe_url(url):
+    """
+    Classify a URL using one sniffed GET (PDF content type, auth and WFS errors).
+    Returns a dict with the (group, details) classification plus the observed
+    HTTP status and Content-Type, for the probe cache.
+    """
+    result = {"group": None, "details": "", "status": None, "content_type": None}
+
+    sniff = sniff_url(url)
+    if sniff is None:
+        return result
+    result["status"] = sniff["status"]
+    result["content_type"] = sniff["content_type"]
+
+    if "application/pdf" in sniff["content_type"]:
+        return dict(result, group="active document links", details="confirmed via Content-Type check")
+
+    if sniff["content_type"].startswith("application/json"):
+        # Error bodies are small; a truncated body is a real payload, not an error
+        try:
+            json_body = json.loads(sniff["body"]) if not sniff["truncated"] else {}
             error = json_body.get("error", {})
             if str(error.get("code", "")).strip() == "499" or "token" in error.get("message", "").lower():
-                return ("auth error", "Token or authentication required (JSON error response)")
-        elif "token required" in r.text.lower():
-            return ("auth error", "Token or authentication required (text body)")
-    except:
-        pass
+                return dict(result, group="auth error",
+                            details="Token or authentication required (JSON error response)")
+        except (ValueError, AttributeError):
+            pass
+    elif "token required" in sniff["text"]:
+        return dict(result, group="auth error", details="Token or authentication required (text body)")
 
     if "getfeature" in url.lower() or "wfs" in url.lower():
-        text = fetch_text_content(url)
+        text = sniff["text"] if sniff["status"] == 200 else ""
         if "serviceexception" in text and "feature" in text:
-            return ("wfs error", "Likely invalid typeName - check WFS GetCapabilities")
-
-    return (None, "")
-
-def main(output_dir):
-    # Load failed resources
-    csv_url = (
-        "https://datasette.planning.data.gov.uk/digital-land.csv?"
-        "sql=select+dataset%2C+elapsed%2C+r.end_date%2C+r.start_date%2C+exception%2C+r.resource%2C+status+"
-        "from+converted_resource+cr+inner+join+resource+r+on+cr.resource%3Dr.resource+"
-        "where+status%3D'failed'+and+(r.end_date+is+null+or+r.end_date%3D'')+"
-        "order+by+r.start_date+desc+limit+1000"
-    )
-    df_failed = pd.read_csv(StringIO(requests.get(csv_url).text))
+            return dict(result, group="wfs error",
+                        details="Likely invalid typeName - check WFS GetCapabilities")
+
+    return result
+
+def classify_failed_resources(df, cache_path=None, ttl_hours=PROBE_CACHE_TTL_HOURS,
+                              max_workers=PROBE_WORKERS, per_host=PROBE_PER_HOST,
+                              time_budget=PROBE_TIME_BUDGET):
+    """
+    Classify every row of df. URL-only rules are applied first; remaining
+    distinct URLs are served from the probe cache when a fresh result exists,
+    and the rest are probed concurrently (bounded per host and overall time).
+
+    Returns:
+        list: (group, details) per row, in row order.
+    """
+    urls = [endpoint_url_of(row) for row in df[["endpoint_url"]].to_dict("records")]
+    results = {url: classify_by_url(url) for url in dict.fromkeys(urls)}
+    to_probe = [url for url, result in results.items() if result is None]
+
+    cache = open_probe_cache(cache_path) if cache_path and to_probe else None
+    try:
+        if cache is not None:
+            cached = get_cached_probes(cache, to_probe, ttl_hours)
+            results.update((url, (r["group"], r["details"])) for url, r in cached.items())
+            to_probe = [url for url in to_probe if url not in cached]
+            print(f"Probe cache: {len(cached)} hit(s), {len(to_probe)} URL(s) to probe")
+
+        if to_probe and time_budget is not None and time_budget <= 0:
+            print(f"[WARNING] Probe time budget spent: {len(to_probe)} URL(s) not checked")
+            results.update((url, PROBE_SKIPPED) for url in to_probe)
+        elif to_probe:
+            probed = run_probes(
+                to_probe, probe_url, default=None,
+                max_workers=max_workers, per_host=per_host, time_budget=time_budget,
+            )
+            fresh = {url: r for url, r in zip(to_probe, probed) if r is not None}
+            results.update((url, (r["group"], r["details"])) for url, r in fresh.items())
+            results.update((url, PROBE_SKIPPED) for url, r in zip(to_probe, probed) if r is None)
+            if cache is not None:
+                store_probes(cache, {url: r for url, r in fresh.items() if r["status"] is not None})
+    finally:
+        if cache is not None:
+            cache.close()
+
+    return [results[url] for url in urls]
+
+def load_metadata():
+    """
+    Load the endpoint/source metadata joined onto each failed resource.
 
-    # Supporting metadata
-    df_endpoint = pd.read_csv("https://datasette.planning.data.gov.uk/digital-land/endpoint.csv?_stream=on")[["endpoint", "endpoint_url"]]
-    df_resource_endpoint = pd.read_csv("https://datasette.planning.data.gov.uk/digital-land/resource_endpoint.csv?_stream=on")[["endpoint", "resource"]]
-    df_source_raw = pd.read_csv("https://datasette.planning.data.gov.uk/digital-land/source.csv?_stream=on")
+    Returns:
+        tuple: (resource_endpoint, endpoint, source) DataFrames, deduplicated on their join keys.
+    """
+    # Shared snapshots, downloaded once per run
+    df_endpoint = get_snapshot("digital-land", "endpoint")[["endpoint", "endpoint_url"]]
+    df_resource_endpoint = get_snapshot("digital-land", "resource_endpoint")[["endpoint", "resource"]]
+    df_source_raw = get_snapshot("digital-land", "source")
     df_source_raw["organisation_ref"] = df_source_raw["organisation"].str.replace(r"^.*?:", "", regex=True).astype(str)
     df_source = df_source_raw[["endpoint", "source", "collection", "organisation_ref"]]
 
-    # Join metadata
     df_resource_endpoint = df_resource_endpoint.drop_duplicates(subset="resource", keep="last")
     df_source = df_source.drop_duplicates(subset="endpoint", keep="last")
+    return df_resource_endpoint, df_endpoint, df_source
+
+def flag_chunk(df_failed, metadata, cache_path, ttl_hours, time_budget):
+    """
+    Join metadata onto one chunk of failed resources and classify it.
+
+    Returns:
+        pd.DataFrame: The chunk with OUTPUT_COLUMNS.
+    """
+    df_resource_endpoint, df_endpoint, df_source = metadata
     df = df_failed.merge(df_resource_endpoint, on="resource", how="left")
     df = df.merge(df_endpoint, on="endpoint", how="left")
     df = df.merge(df_source, on="endpoint", how="left")
 
     # Classify
-    df[["group", "details"]] = df.apply(lambda row: pd.Series(classify_issue(row)), axis=1)
+    classified = classify_failed_resources(
+        df, cache_path=cache_path, ttl_hours=ttl_hours, time_budget=time_budget
+    )
+    df["group"] = [group for group, _ in classified]
+    df["details"] = [details for _, details in classified]
 
     # Manual patches
     force_pdf_urls = [
@@ -121,17 +250,41 @@ def main(output_dir):
     # Retirement logic
     df["recommend_retirement"] = df["group"].apply(lambda g: "yes" if g == "active document links" else "no")
 
-    # Output
+    return df[OUTPUT_COLUMNS]
+
+def main(output_dir, time_budget=PROBE_TIME_BUDGET, cache_ttl_hours=PROBE_CACHE_TTL_HOURS):
+    metadata = load_metadata()
+
     os.makedirs(output_dir, exist_ok=True)
     output_path = os.path.join(output_dir, "flagged_failed_resources.csv")
-    df_out = df[[
-        "resource", "source", "collection", "endpoint_url", "group", "details", "recommend_retirement"
-    ]]
-    df_out.to_csv(output_path, index=False)
-    print(f"Saved {len(df_out)} rows to {output_path}")
+    cache_path = os.path.join(SNAPSHOT_DIR, PROBE_CACHE_FILE)
+
+    # The probe time budget covers the whole run, not each chunk
+    deadline = time.monotonic() + time_budget
+    output = ChunkedOutput(output_path, OUTPUT_COLUMNS)
+    # Stream failed resources page by page; each chunk is classified and appended.
+    # strict: a failed page stops the script rather than saving a truncated report
+    pages = iter_datasette_keyset_pages(
+        "digital-land", FAILED_RESOURCES_SQL, keys=FAILED_RESOURCES_KEYS, descending=True, strict=True
+    )
+    for df_failed in pages:
+        df_failed = df_failed.drop(columns=list(FAILED_RESOURCES_KEYS))
+        df_out = flag_chunk(
+            df_failed, metadata, cache_path, cache_ttl_hours,
+            time_budget=max(0.0, deadline - time.monotonic()),
+        )
+        output.write(df_out)
+        print(f"Classified {output.rows} failed resource(s) so far")
+
+    for path in output.close():
+        print(f"Saved {output.rows} rows to {path}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Classify failed resources and flag potential retirement.")
     parser.add_argument("--output-dir", type=str, required=True, help="Directory to save the output CSV")
+    parser.add_argument("--probe-budget", type=float, default=PROBE_TIME_BUDGET, help="Seconds allowed for all URL probes")
+    parser.add_argument("--probe-ttl-hours", type=float, default=PROBE_CACHE_TTL_HOURS, help="Reuse cached probe results younger than this")
+    add_format_argument(parser)
     args = parser.parse_args()
-    main(args.output_dir)
+    set_output_format(args.format)
+    main(args.output_dir, time_budget=args.probe_budget, cache_ttl_hours=args.probe_ttl_hours)
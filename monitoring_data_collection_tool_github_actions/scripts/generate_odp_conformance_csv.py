@@ -4,15 +4,16 @@ It checks provisions, endpoint summaries, and issue logs against a specification
 performance summary for each dataset per organisation.
 """
 
-import json
-import logging
 import numpy as np
 import pandas as pd
-import requests
-from requests import adapters
-from urllib3 import Retry
 import argparse
 import os
+from _datasette import get_datasette_query, get_datasette_parallel_query
+from _specification import get_dataset_field_df
+from _output import add_format_argument, set_output_format, write_output
+
+# run.py delta reports: the columns identifying a row of each output
+DELTA_KEYS = {"odp-conformance.csv": ["organisation", "cohort", "dataset", "endpoint", "resource"]}
 
 def parse_args():
     """
@@ -28,51 +29,9 @@ def parse_args():
         required=True,
         help="Directory to save exported CSVs"
     )
+    add_format_argument(parser)
     return parser.parse_args()
 
-def get_datasette_http():
-    """
-    Creates and returns a requests.Session object with retry logic built in.
-    Used for robust querying of Datasette endpoints.
-    """
-    retry_strategy = Retry(total=3, status_forcelist=[400], backoff_factor=0)
-
-    adapter = adapters.HTTPAdapter(max_retries=retry_strategy)
-
-    http = requests.Session()
-    http.mount("https://", adapter)
-    http.mount("http://", adapter)
-
-    return http
-
-
-def get_datasette_query(db, sql, filter=None, url="https://datasette.planning.data.gov.uk"):
-    """
-    Executes an SQL query against a Datasette database and returns the result as a DataFrame.
-
-    Args:
-        db (str): The database name (e.g. 'digital-land')
-        sql (str): SQL query string
-        filter (dict, optional): Additional query parameters
-        url (str): Base Datasette URL
-
-    Returns:
-        pd.DataFrame | None: Query result as a DataFrame or None on failure
-    """
-    url = f"{url}/{db}.json"
-    params = {"sql": sql, "_shape": "array", "_size": "max"}
-    if filter:
-        params.update(filter)
-    try:
-        http = get_datasette_http()
-        resp = http.get(url, params=params)
-        resp.raise_for_status()
-        df = pd.DataFrame.from_dict(resp.json())
-        return df
-    except Exception as e:
-        logging.warning(e)
-        return None
-
 def get_provisions(selected_cohorts, all_cohorts):
     """
     Queries the Datasette 'provision' table for expected datasets for selected cohorts.
@@ -162,55 +121,60 @@ COHORTS = [
 ]
 
 
-def get_column_field_summary(dataset_clause, offset):
+def get_column_field_summary(dataset_clause):
     """
     Retrieves endpoint dataset resource summaries for datasets matching the clause.
+    Pages are fetched concurrently by rowid range, each keyset-paginated on the joined rowids.
 
     Args:
         dataset_clause (str): SQL filter for datasets (e.g. "edrs.pipeline = 'tree'")
-        offset (int): Row offset for pagination
 
     Returns:
         pd.DataFrame: Results from `endpoint_dataset_resource_summary` joined with endpoint metadata.
     """
     sql = f"""
-    SELECT edrs.*, rle.licence
+    SELECT
+        edrs.rowid AS edrs_rowid,
+        COALESCE(rle.rle_rowid, 0) AS rle_rowid,
+        eds.eds_rowid,
+        edrs.*,
+        rle.licence
     FROM endpoint_dataset_resource_summary AS edrs
     LEFT JOIN (
-        SELECT endpoint, licence, dataset
+        SELECT rowid AS rle_rowid, endpoint, licence, dataset
         FROM reporting_latest_endpoints
     ) AS rle ON edrs.endpoint = rle.endpoint and edrs.dataset = rle.dataset
     LEFT JOIN (
-        SELECT endpoint, end_date as endpoint_end_date, dataset
+        SELECT rowid AS eds_rowid, endpoint, end_date as endpoint_end_date, dataset
         FROM endpoint_dataset_summary
     ) as eds on edrs.endpoint = eds.endpoint and edrs.dataset = eds.dataset
     WHERE edrs.resource != ''
     and eds.endpoint_end_date=''
     and ({dataset_clause})
-    limit 1000 offset {offset}
     """
-    column_field_df = get_datasette_query("performance", sql)
+    column_field_df = get_datasette_parallel_query(
+        "performance", sql, keys=("edrs_rowid", "rle_rowid", "eds_rowid")
+    )
 
     return column_field_df
 
 
-def get_issue_summary(dataset_clause, offset):
+def get_issue_summary(dataset_clause):
     """
     Retrieves summarised issue counts per dataset and endpoint.
+    Pages are fetched concurrently by rowid range.
 
     Args:
         dataset_clause (str): SQL WHERE clause to filter datasets.
-        offset (int): Pagination offset for result set.
 
     Returns:
         pd.DataFrame: Issue summary from Datasette.
     """
     sql = f"""
-    select  * from endpoint_dataset_issue_type_summary edrs
+    select edrs.rowid AS edrs_rowid, edrs.* from endpoint_dataset_issue_type_summary edrs
     where ({dataset_clause})
-    limit 1000 offset {offset}
     """
-    issue_summary_df = get_datasette_query("performance", sql)
+    issue_summary_df = get_datasette_parallel_query("performance", sql, keys=("edrs_rowid",))
     return issue_summary_df
 
 
@@ -245,20 +209,11 @@ def get_odp_conformance_summary(dataset_types, cohorts):
 
     provision_df = get_provisions(cohorts, COHORTS)
 
-    # Download column field summary table
-    # Use pagination in case rows returned > 1000
-    pagination_incomplete = True
-    offset = 0
-    column_field_df_list = []
-    while pagination_incomplete:
-        column_field_df = get_column_field_summary(dataset_clause, offset)
-        column_field_df_list.append(column_field_df)
-        pagination_incomplete = len(column_field_df) == 1000
-        offset += 1000
-    if len(column_field_df_list) == 0:
-        return {"params": params, "rows": [], "headers": []}
-    column_field_df = pd.concat(column_field_df_list)
-      
+    # Download column field summary table (paged, rows returned may be > 1000)
+    column_field_df = get_column_field_summary(dataset_clause)
+    if column_field_df.empty:
+        return {"params": params, "rows": [], "headers": []}, pd.DataFrame()
+
     column_field_df = pd.merge(
         column_field_df, provision_df, on=["organisation", "cohort"], how="left"
     )
@@ -267,16 +222,8 @@ def get_odp_conformance_summary(dataset_types, cohorts):
     column_field_df["organisation_name"] = column_field_df["organisation_name"].fillna("Unknown")
     column_field_df["cohort_start_date"] = column_field_df["cohort_start_date"].fillna("")
 
-    # Download issue summary table
-    pagination_incomplete = True
-    offset = 0
-    issue_df_list = []
-    while pagination_incomplete:
-        issue_df = get_issue_summary(dataset_clause, offset)
-        issue_df_list.append(issue_df)
-        pagination_incomplete = len(issue_df) == 1000
-        offset += 1000
-    issue_df = pd.concat(issue_df_list)
+    # Download issue summary table (paged)
+    issue_df = get_issue_summary(dataset_clause)
 
     dataset_field_df = get_dataset_field()
 
@@ -293,81 +240,32 @@ def get_odp_conformance_summary(dataset_types, cohorts):
         & (~dataset_field_df["field"].isin(["entity", "organisation", "prefix"]))
     ]
 
+    # Precomputed specification index: dataset -> fields (and field count)
+    spec_fields = get_spec_field_index(dataset_field_df)
+    spec_field_count = dataset_field_df.groupby("dataset").size()
+
     # Filter out fields not in spec
-    column_field_df["mapping_field"] = column_field_df.replace({'"', ""}).apply(
-        lambda row: [
-            field
-            for field in (
-                row["mapping_field"].split(";") if row["mapping_field"] else ""
-            )
-            if field
-            in dataset_field_df[dataset_field_df["dataset"] == row["dataset"]][
-                "field"
-            ].values
-        ],
-        axis=1,
-    )
-    column_field_df["non_mapping_field"] = column_field_df.replace({'"', ""}).apply(
-        lambda row: [
-            field
-            for field in (
-                row["non_mapping_field"].split(";") if row["non_mapping_field"] else ""
-            )
-            if field
-            in dataset_field_df[dataset_field_df["dataset"] == row["dataset"]][
-                "field"
-            ].values
-        ],
-        axis=1,
-    )
+    column_field_df["mapping_field"] = split_spec_fields(column_field_df, "mapping_field", spec_fields)
+    column_field_df["non_mapping_field"] = split_spec_fields(column_field_df, "non_mapping_field", spec_fields)
 
     # Map entity errors to reference field
     issue_df["field"] = issue_df["field"].replace("entity", "reference")
     # Filter out issues for fields not in dataset field (specification)
-    issue_df["field"] = issue_df.apply(
-        lambda row: (
-            row["field"]
-            if row["field"]
-            in dataset_field_df[dataset_field_df["dataset"] == row["dataset"]][
-                "field"
-            ].values
-            else None
-        ),
-        axis=1,
+    issue_df["field"] = issue_df["field"].where(
+        in_spec(issue_df["dataset"], issue_df["field"], spec_fields), None
     )
 
     # Create field matched and field supplied scores
-    column_field_df["field_matched"] = column_field_df.apply(
-        lambda row: len(row["mapping_field"]) if row["mapping_field"] else 0, axis=1
-    )
-    column_field_df["field_supplied"] = column_field_df.apply(
-        lambda row: row["field_matched"]
-        + (len(row["non_mapping_field"]) if row["non_mapping_field"] else 0),
-        axis=1,
+    column_field_df["field_matched"] = column_field_df["mapping_field"].str.len()
+    column_field_df["field_supplied"] = (
+        column_field_df["field_matched"] + column_field_df["non_mapping_field"].str.len()
     )
-    column_field_df["field"] = column_field_df.apply(
-        lambda row: len(
-            dataset_field_df[dataset_field_df["dataset"] == row["dataset"]]
-        ),
-        axis=1,
+    column_field_df["field"] = (
+        column_field_df["dataset"].map(spec_field_count).fillna(0).astype(int)
     )
 
-    # Check for fields which have error issues
-    results_issues = [
-        issue_df[
-            (issue_df["resource"] == r["resource"]) & (issue_df["severity"] == "error")
-        ]
-        for index, r in column_field_df.iterrows()
-    ]
-    results_issues_df = pd.concat(results_issues)
-
     # Create fields with errors column
-    column_field_df["field_errors"] = column_field_df.apply(
-        lambda row: len(
-            results_issues_df[row["resource"] == results_issues_df["resource"]]
-        ),
-        axis=1,
-    )
+    column_field_df["field_errors"] = count_field_errors(column_field_df, issue_df)
 
     # Create endpoint ID column to track multiple endpoints per organisation-dataset
     column_field_df["endpoint_no."] = (
@@ -606,33 +504,100 @@ def get_background_class(text):
             return "reporting-" + str(group) + "0-" + str(group + 1) + "0-background"
     return ""
 
+def count_field_errors(column_field_df, issue_df):
+    """
+    Counts the error issues of each row's resource, with one grouped pass over
+    the issues. A resource listed on n rows has its errors counted n times, as
+    the per-row issue scan this replaced did.
+
+    Args:
+        column_field_df (pd.DataFrame): Column field summary with a 'resource' column.
+        issue_df (pd.DataFrame): Issues with 'resource' and 'severity' columns.
+
+    Returns:
+        pd.Series: Error count per row of column_field_df (0 where none).
+    """
+    error_counts = issue_df.loc[issue_df["severity"] == "error", "resource"].value_counts()
+    resource_rows = column_field_df["resource"].value_counts()
+    return (
+        column_field_df["resource"].map(error_counts)
+        * column_field_df["resource"].map(resource_rows)
+    ).fillna(0).astype(int)
+
+def get_spec_field_index(dataset_field_df):
+    """
+    Builds a lookup of the specification fields for each dataset.
+
+    Args:
+        dataset_field_df (pd.DataFrame): Dataset/field rows from the specification.
+
+    Returns:
+        dict: Dataset name -> frozenset of field names.
+    """
+    return {
+        dataset: frozenset(fields)
+        for dataset, fields in dataset_field_df.groupby("dataset")["field"]
+    }
+
+def in_spec(datasets, fields, spec_fields):
+    """
+    Checks (dataset, field) pairs against the specification, one vectorised
+    membership test per dataset.
+
+    Args:
+        datasets (pd.Series): Dataset name for each pair.
+        fields (pd.Series): Field name for each pair (same length as datasets).
+        spec_fields (dict): Output of get_spec_field_index.
+
+    Returns:
+        np.ndarray: Boolean mask, True where the field is in the dataset's spec.
+    """
+    mask = np.zeros(len(fields), dtype=bool)
+    dataset_values = datasets.to_numpy()
+    for dataset, allowed in spec_fields.items():
+        in_dataset = dataset_values == dataset
+        if in_dataset.any():
+            mask[in_dataset] = fields[in_dataset].isin(allowed).to_numpy()
+    return mask
+
+def split_spec_fields(df, column, spec_fields):
+    """
+    Splits a ';'-separated field column into lists, keeping only the fields
+    in each row's dataset specification (order preserved).
+
+    Args:
+        df (pd.DataFrame): Frame with 'dataset' and the field column (unique index).
+        column (str): Name of the ';'-separated field column.
+        spec_fields (dict): Output of get_spec_field_index.
+
+    Returns:
+        pd.Series: A list of in-spec fields per row (empty list if none).
+    """
+    exploded = df[column].fillna("").astype(str).str.split(";").explode()
+    datasets = df["dataset"].reindex(exploded.index)
+    kept = exploded[in_spec(datasets, exploded, spec_fields)]
+    lists = kept.groupby(level=0).agg(list).reindex(df.index)
+    return pd.Series(
+        [value if isinstance(value, list) else [] for value in lists], index=df.index
+    )
+
 def get_dataset_field():
     """
-    Loads the official dataset-field specification JSON from a local CSV file.
+    Loads the official dataset-field specification (compiled and cached from
+    the local specification.csv, see _specification.py).
 
     Returns:
         pd.DataFrame: Each row represents a dataset/field combination from the JSON spec.
     """
-    SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-    spec_path = os.path.join(SCRIPT_DIR, "..", "documentation", "utils", "specification.csv")
-    spec_path = os.path.abspath(spec_path)  # Clean it up
-    
-    specification_df = pd.read_csv(spec_path)
-    
-    rows = []
-    for index, row in specification_df.iterrows():
-        specification_dicts = json.loads(row["json"])
-        for dict in specification_dicts:
-            dataset = dict["dataset"]
-            fields = [field["field"] for field in dict["fields"]]
-            for field in fields:
-                rows.append({"dataset": dataset, "field": field})
-    return pd.DataFrame(rows)
+    return get_dataset_field_df()
 
-if __name__ == "__main__":
-    # Parse CLI args
-    args = parse_args()
-    output_dir = args.output_dir 
+def main(output_dir):
+    """
+    Builds the ODP conformance summary and saves it as odp-conformance.csv.
+
+    Args:
+        output_dir (str): Directory to save the conformance CSV.
+    """
     output_path = os.path.join(output_dir, "odp-conformance.csv")
 
     # Run summary function and filter invalid cohort rows
@@ -640,6 +605,11 @@ if __name__ == "__main__":
     df = df[df['cohort'].notna() & (df['cohort'].str.strip() != "")]
 
     # Save final output
-    df.to_csv(output_path, index=False)
-    print(f"Saved ODP conformance summary to {output_path}")
+    for path in write_output(df, output_path):
+        print(f"Saved ODP conformance summary to {path}")
 
+if __name__ == "__main__":
+    # Parse CLI args
+    args = parse_args()
+    set_output_format(args.format)
+    main(args.output_dir)
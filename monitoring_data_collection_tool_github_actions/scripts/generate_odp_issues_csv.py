@@ -5,11 +5,12 @@ of expected dataset performance per organisation and cohort.
 """
 
 import os
-import pandas as pd
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 import argparse
+from _datasette import get_datasette_query, get_datasette_keyset_query
+from _output import add_format_argument, set_output_format, write_output
+
+# run.py delta reports: the columns identifying a row of each output
+DELTA_KEYS = {"odp-issue.csv": ["organisation", "cohort", "pipeline", "endpoint", "resource", "issue_type"]}
 
 # Dataset Definitions
 SPATIAL_DATASETS = [
@@ -26,44 +27,6 @@ DOCUMENT_DATASETS = [
 ]
 ALL_DATASETS = SPATIAL_DATASETS + DOCUMENT_DATASETS
 
-# HTTP Helpers
-def get_datasette_http():
-    """
-    Returns a requests.Session object with retry logic for querying Datasette endpoints.
-
-    Returns:
-        requests.Session: A session object with retry strategy for robustness.
-    """
-    retry_strategy = Retry(total=3, status_forcelist=[400], backoff_factor=0.2)
-    adapter = HTTPAdapter(max_retries=retry_strategy)
-    http = requests.Session()
-    http.mount("https://", adapter)
-    return http
-
-# Datasette Query Helper
-def get_datasette_query(db: str, sql: str, url="https://datasette.planning.data.gov.uk") -> pd.DataFrame:
-    """
-    Executes an SQL query against the specified Datasette database.
-
-    Args:
-        db (str): Datasette database name.
-        sql (str): SQL query string.
-        url (str): Base Datasette URL.
-
-    Returns:
-        pd.DataFrame: Resulting data as a DataFrame, or empty on failure.
-    """
-    full_url = f"{url}/{db}.json"
-    params = {"sql": sql, "_shape": "array", "_size": "max"}
-    try:
-        http = get_datasette_http()
-        response = http.get(full_url, params=params)
-        response.raise_for_status()
-        return pd.DataFrame(response.json())
-    except Exception as e:
-        print(f"[ERROR] Datasette query failed: {e}")
-        return pd.DataFrame()
-
 # Provision Query
 def get_provisions():
     """
@@ -88,19 +51,22 @@ def get_provisions():
     return get_datasette_query("digital-land", sql)
 
 # Issue Query (Paged)
-def get_issue_type_chunk(dataset_clause, offset):
+def get_full_issue_type_summary(datasets):
     """
-    Retrieves a paged chunk of issue type summaries joined with endpoint metadata.
+    Retrieves the full issue summary table across all datasets, joined with
+    endpoint metadata, using keyset pagination on the rowids of both tables.
 
     Args:
-        dataset_clause (str): SQL clause to filter datasets.
-        offset (int): Pagination offset for the query.
+        datasets (list): List of dataset names to include.
 
     Returns:
-        pd.DataFrame: Chunk of issue summary data.
+        pd.DataFrame: Combined issue summary for all specified datasets.
     """
+    dataset_clause = "WHERE " + " OR ".join(f"edits.dataset = '{ds}'" for ds in datasets)
     sql = f"""
         SELECT
+            edits.rowid AS edits_rowid,
+            COALESCE(eds.eds_rowid, 0) AS eds_rowid,
             edits.*,
             eds.endpoint_end_date,
             eds.endpoint_entry_date,
@@ -108,38 +74,14 @@ def get_issue_type_chunk(dataset_clause, offset):
             eds.latest_exception
         FROM endpoint_dataset_issue_type_summary edits
         LEFT JOIN (
-            SELECT endpoint, end_date as endpoint_end_date,
+            SELECT rowid AS eds_rowid, endpoint, end_date as endpoint_end_date,
                    entry_date as endpoint_entry_date,
                    latest_status, latest_exception
             FROM endpoint_dataset_summary
         ) eds ON edits.endpoint = eds.endpoint
         {dataset_clause}
-        LIMIT 1000 OFFSET {offset}
     """
-    return get_datasette_query("performance", sql)
-
-def get_full_issue_type_summary(datasets):
-    """
-    Retrieves the full issue summary table across all datasets using pagination.
-
-    Args:
-        datasets (list): List of dataset names to include.
-
-    Returns:
-        pd.DataFrame: Combined issue summary for all specified datasets.
-    """
-    dataset_clause = "WHERE " + " OR ".join(f"edits.dataset = '{ds}'" for ds in datasets)
-    df_list = []
-    offset = 0
-    while True:
-        chunk = get_issue_type_chunk(dataset_clause, offset)
-        if chunk.empty:
-            break
-        df_list.append(chunk)
-        if len(chunk) < 1000:
-            break
-        offset += 1000
-    return pd.concat(df_list, ignore_index=True)
+    return get_datasette_keyset_query("performance", sql, keys=("edits_rowid", "eds_rowid"))
 
 # Main CSV Generator
 def generate_detailed_issue_csv(output_dir: str, dataset_type="all") -> str:
@@ -176,7 +118,7 @@ def generate_detailed_issue_csv(output_dir: str, dataset_type="all") -> str:
     print("[INFO] Saving CSV...")
     os.makedirs(output_dir, exist_ok=True)
     output_path = os.path.join(output_dir, "odp-issue.csv")
-    merged[
+    written = write_output(merged[
         [
             "organisation",
             "cohort",
@@ -198,10 +140,19 @@ def generate_detailed_issue_csv(output_dir: str, dataset_type="all") -> str:
             "resource_start_date",
             "resource_end_date",
         ]
-    ].to_csv(output_path, index=False)
+    ], output_path)
+
+    print(f"[SUCCESS] Saved: {', '.join(written)} ({len(merged)} rows)")
+    return written[0]
+
+def main(output_dir):
+    """
+    Generates the issue-level CSV for all ODP datasets.
 
-    print(f"[SUCCESS] CSV saved: {output_path} ({len(merged)} rows)")
-    return output_path
+    Args:
+        output_dir (str): Path to the output directory.
+    """
+    generate_detailed_issue_csv(output_dir, dataset_type="all")
 
 # CLI Argument Parser
 def parse_args():
@@ -218,9 +169,11 @@ def parse_args():
         required=True,
         help="Directory to save the output CSV"
     )
+    add_format_argument(parser)
     return parser.parse_args()
 
 # Script Entry Point
 if __name__ == "__main__":
     args = parse_args()
-    generate_detailed_issue_csv(args.output_dir, dataset_type="all")
+    set_output_format(args.format)
+    main(args.output_dir)
@@ -11,10 +11,12 @@ The script:
 
 import os
 import pandas as pd
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util import Retry
 import argparse
+from _datasette import get_datasette_query
+from _output import add_format_argument, set_output_format, write_output
+
+# run.py delta reports: the columns identifying a row of each output
+DELTA_KEYS = {"odp-status.csv": ["organisation", "cohort", "pipeline", "endpoint"]}
 
 # Dataset to Pipeline Map
 ALL_PIPELINES = {
@@ -28,44 +30,26 @@ ALL_PIPELINES = {
     ],
 }
 
-# Datasette Query Helpers
-def get_datasette_http():
-    """
-    Returns a requests session with retry logic to handle larger Datasette queries.
-
-    Returns:
-        requests.Session: Session with retry strategy enabled.
-    """
-    retry_strategy = Retry(total=3, status_forcelist=[400], backoff_factor=0.2)
-    adapter = HTTPAdapter(max_retries=retry_strategy)
-    http = requests.Session()
-    http.mount("https://", adapter)
-    return http
-
-
-def get_datasette_query(db: str, sql: str, url="https://datasette.planning.data.gov.uk") -> pd.DataFrame:
-    """
-    Executes SQL against a Datasette database and returns the result as a DataFrame.
-
-    Args:
-        db (str): The name of the Datasette database (e.g., 'digital-land').
-        sql (str): SQL query string to run.
-        url (str): Base URL of the Datasette instance.
-
-    Returns:
-        pd.DataFrame: The result set, or empty DataFrame on error.
-    """
-    full_url = f"{url}/{db}.json"
-    params = {"sql": sql, "_shape": "array", "_size": "max"}
-
-    try:
-        http = get_datasette_http()
-        response = http.get(full_url, params=params)
-        response.raise_for_status()
-        return pd.DataFrame.from_dict(response.json())
-    except Exception as e:
-        print(f"Datasette query failed: {e}")
-        return pd.DataFrame()
+# Endpoint columns carried into the output, and final column order
+ENDPOINT_COLUMNS = [
+    "endpoint",
+    "endpoint_url",
+    "licence",
+    "status",
+    "days_since_200",
+    "exception",
+    "resource",
+    "latest_log_entry_date",
+    "endpoint_entry_date",
+    "endpoint_end_date",
+    "resource_start_date",
+    "resource_end_date",
+]
+OUTPUT_COLUMNS = (
+    ["organisation", "cohort", "name", "collection", "pipeline"]
+    + ENDPOINT_COLUMNS
+    + ["cohort_start_date"]
+)
 
 # Data Retrieval Functions
 def get_provisions():
@@ -119,6 +103,8 @@ def get_endpoints():
         FROM reporting_latest_endpoints rle
     """
     df = get_datasette_query("performance", sql)
+    if df.empty:
+        return df
 
     # Normalise organisation codes (remove -eng suffix)
     df["organisation"] = df["organisation"].str.replace("-eng", "", regex=False)
@@ -134,77 +120,56 @@ def generate_odp_summary_csv(output_dir: str) -> str:
 
     Returns:
         str: Path to the saved CSV file.
+
+    Raises:
+        RuntimeError: If no provisions or endpoints were returned (e.g. the
+        Datasette query failed), rather than writing a misleading report.
     """
     provisions = get_provisions()
+    if provisions.empty:
+        raise RuntimeError("No provisions returned from Datasette (digital-land); odp-status.csv not written")
     endpoints = get_endpoints()
-    output_rows = []
-
-    for _, row in provisions.iterrows():
-        organisation = row["organisation"]
-        cohort = row["cohort"]
-        name = row["name"]
-        cohort_start_date = row["cohort_start_date"]
-
-        for collection, pipelines in ALL_PIPELINES.items():
-            for pipeline in pipelines:
-                match = endpoints[
-                    (endpoints["organisation"] == organisation) &
-                    (endpoints["pipeline"] == pipeline)
-                ]
-
-                if not match.empty:
-                    # Endpoint(s) exist — add one row per match
-                    for _, ep in match.iterrows():
-                        output_rows.append({
-                            "organisation": organisation,
-                            "cohort": cohort,
-                            "name": name,
-                            "collection": collection,
-                            "pipeline": pipeline,
-                            "endpoint": ep["endpoint"],
-                            "endpoint_url": ep["endpoint_url"],
-                            "licence": ep["licence"],
-                            "status": ep["status"],
-                            "days_since_200": ep["days_since_200"],
-                            "exception": ep["exception"],
-                            "resource": ep["resource"],
-                            "latest_log_entry_date": ep["latest_log_entry_date"],
-                            "endpoint_entry_date": ep["endpoint_entry_date"],
-                            "endpoint_end_date": ep["endpoint_end_date"],
-                            "resource_start_date": ep["resource_start_date"],
-                            "resource_end_date": ep["resource_end_date"],
-                            "cohort_start_date": cohort_start_date,
-                        })
-                else:
-                    # No endpoint — mark as missing
-                    output_rows.append({
-                        "organisation": organisation,
-                        "cohort": cohort,
-                        "name": name,
-                        "collection": collection,
-                        "pipeline": pipeline,
-                        "endpoint": "No endpoint added",
-                        "endpoint_url": "",
-                        "licence": "",
-                        "status": "",
-                        "days_since_200": "",
-                        "exception": "",
-                        "resource": "",
-                        "latest_log_entry_date": "",
-                        "endpoint_entry_date": "",
-                        "endpoint_end_date": "",
-                        "resource_start_date": "",
-                        "resource_end_date": "",
-                        "cohort_start_date": cohort_start_date,
-                    })
-
-    # Convert output to DataFrame and save as CSV
-    df_final = pd.DataFrame(output_rows)
+    if endpoints.empty:
+        raise RuntimeError("No endpoints returned from Datasette (performance); odp-status.csv not written")
+
+    # Every provision is expected to supply every pipeline
+    pipeline_map = pd.DataFrame(
+        [(collection, pipeline) for collection, pipelines in ALL_PIPELINES.items() for pipeline in pipelines],
+        columns=["collection", "pipeline"],
+    )
+    expected = provisions[["organisation", "cohort", "name", "cohort_start_date"]].merge(
+        pipeline_map, how="cross"
+    )
+
+    # One left merge against endpoints (object dtype keeps values as they were)
+    endpoint_info = endpoints[["organisation", "pipeline"] + ENDPOINT_COLUMNS].astype(
+        {col: object for col in ENDPOINT_COLUMNS}
+    )
+    df_final = expected.merge(
+        endpoint_info, on=["organisation", "pipeline"], how="left", indicator=True
+    )
+
+    # No endpoint — mark as missing
+    missing = df_final["_merge"] == "left_only"
+    df_final.loc[missing, ENDPOINT_COLUMNS] = ""
+    df_final.loc[missing, "endpoint"] = "No endpoint added"
+    df_final = df_final[OUTPUT_COLUMNS]
+
+    # Save as CSV
     os.makedirs(output_dir, exist_ok=True)
     output_path = os.path.join(output_dir, "odp-status.csv")
-    df_final.to_csv(output_path, index=False)
-    print(f"CSV generated at {output_path} with {len(df_final)} rows")
-    return output_path
+    written = write_output(df_final, output_path)
+    print(f"Generated {', '.join(written)} with {len(df_final)} rows")
+    return written[0]
+
+def main(output_dir):
+    """
+    Generates and saves the ODP endpoint status summary.
+
+    Args:
+        output_dir (str): Directory to save the CSV output.
+    """
+    generate_odp_summary_csv(output_dir)
 
 # CLI Parser
 def parse_args():
@@ -221,13 +186,14 @@ def parse_args():
         required=True,
         help="Directory to save exported CSVs"
     )
+    add_format_argument(parser)
     return parser.parse_args()
 
 # Script Entry Point
 if __name__ == "__main__":
     # Parse CLI arguments
     args = parse_args()
-    output_directory = args.output_dir
+    set_output_format(args.format)
 
     # Generate and save ODP endpoint summary
-    generate_odp_summary_csv(output_directory)
+    main(args.output_dir)
@@ -1,8 +1,12 @@
-import requests
 import pandas as pd
 import urllib.parse
 import os
 import argparse
+from _datasette import get_datasette_http
+from _output import add_format_argument, set_output_format, write_output
+
+# run.py delta reports: the columns identifying a row of each output
+DELTA_KEYS = {"logs-by-week.csv": ["entrydate", "week_start", "status_group"]}
 
 def sql_queried_datasette_tables(urls: dict, sqls: list, save_dir: str):
     """
@@ -36,7 +40,7 @@ def sql_queried_datasette_tables(urls: dict, sqls: list, save_dir: str):
             print(f"Fetching: {name} from SQL URL:\n{full_url}")
 
             # Fetch JSON data and load into DataFrame
-            response = requests.get(full_url)
+            response = get_datasette_http().get(full_url)
             response.raise_for_status()
             data = response.json()
             print(f"Rows returned: {len(data)}")
@@ -47,8 +51,8 @@ def sql_queried_datasette_tables(urls: dict, sqls: list, save_dir: str):
 
             # Save DataFrame to CSV in the specified directory
             save_path = os.path.join(save_dir, csv_name)
-            df.to_csv(save_path, index=False)
-            print(f"Saved: {save_path}")
+            for path in write_output(df, save_path):
+                print(f"Saved: {path}")
 
         except Exception as e:
             # Log failure and continue
@@ -68,12 +72,16 @@ def parse_args():
         required=True,
         help="Directory to save exported CSVs"
     )
+    add_format_argument(parser)
     return parser.parse_args()
 
-if __name__ == "__main__":
-    # Parse arguments from CLI
-    args = parse_args()
+def main(output_dir):
+    """
+    Exports weekly log status counts for the last 6 months.
 
+    Args:
+        output_dir (str): Directory path where the resulting CSV files will be saved.
+    """
     # Define URLs and SQL queries to export
     urls = {
         "logs-by-week": "https://datasette.planning.data.gov.uk/digital-land"
@@ -105,4 +113,10 @@ if __name__ == "__main__":
     ]
 
     # Execute the export
-    sql_queried_datasette_tables(urls, sqls, args.output_dir)
+    sql_queried_datasette_tables(urls, sqls, output_dir)
+
+if __name__ == "__main__":
+    # Parse arguments from CLI
+    args = parse_args()
+    set_output_format(args.format)
+    main(args.output_dir)
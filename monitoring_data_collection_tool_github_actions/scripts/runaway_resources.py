@@ -1,84 +1,336 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
+from urllib.parse import urlencode
 import argparse
+import pickle
+import uuid
 import os
+from _datasette import iter_datasette_csv, iter_datasette_keyset_pages
+from _snapshot import SNAPSHOT_DIR
+from _output import add_format_argument, set_output_format, write_output
 
-def main(output_dir):
-    # Load Data
-    base_url = "https://datasette.planning.data.gov.uk/digital-land"
-    table = "reporting_historic_endpoints"
-    full_url = f"{base_url}/{table}.csv?_stream=on"
+# run.py delta reports: the columns identifying a row of each output
+DELTA_KEYS = {"runaway_resources.csv": ["endpoint"]}
 
-    df = pd.read_csv(full_url)
+# reporting_historic_endpoints is streamed in chunks with only the columns and
+# dtypes used below, so peak memory depends on the chunk size and the number
+# of endpoints, not on the length of the history.
+HISTORIC_TABLE = "reporting_historic_endpoints"
+HISTORIC_PATH = f"digital-land/{HISTORIC_TABLE}.csv"
+CHUNK_SIZE = 100_000
+META_COLS = ["organisation_name", "dataset", "collection", "pipeline", "endpoint_entry_date"]
+DATE_COLS = ["resource_start_date", "resource_end_date"]
+HISTORIC_DTYPES = {
+    "endpoint": "str",
+    "endpoint_end_date": "str",
+    "endpoint_entry_date": "str",
+    "organisation_name": "category",
+    "dataset": "category",
+    "collection": "category",
+    "pipeline": "category",
+}
 
-    # Filter and convert dates
-    df = df[df["endpoint_end_date"].isna()].copy()
-    df["resource_start_date"] = pd.to_datetime(df["resource_start_date"])
-    df["resource_end_date"] = pd.to_datetime(df["resource_end_date"])
+# How partial per-endpoint aggregates are combined across chunks
+COMBINE_AGG = {
+    "resource_count": "sum",
+    "first_resource_start_date": "min",
+    "last_resource_start_date": "max",
+    "last_resource_end_date": "max",
+    "single_day_resources": "sum",
+    **{col: "first" for col in META_COLS},
+}
+
+# Per-endpoint aggregates are kept between runs, so a normal run only
+# re-aggregates the endpoints whose rows changed since the last watermark.
+STATE_PATH = os.path.join(SNAPSHOT_DIR, "runaway_resources.state.pickle")
+STATE_VERSION = 1
+RECENT_DAYS = 30  # daily resource counts kept for the 7 and 30 day flags
+FULL_REFRESH_DAYS = 7  # rebuild from the full table at least this often
+DELTA_BATCH_SIZE = 100  # endpoints per filtered CSV request
+DELTA_MAX_ENDPOINTS = 5000  # beyond this a full reload is cheaper
+
+def iter_historic_endpoints(endpoints=None, chunksize=CHUNK_SIZE):
+    """
+    Yields rows of reporting_historic_endpoints for live endpoints (no
+    endpoint_end_date), chunk by chunk, with resource dates parsed.
+
+    Args:
+        endpoints (list, optional): Only stream the rows of these endpoints.
+        chunksize (int): Rows per chunk.
+    """
+    query = {"_stream": "on"}
+    if endpoints is not None:
+        query["endpoint__in"] = ",".join(endpoints)
+    chunks = iter_datasette_csv(
+        f"{HISTORIC_PATH}?{urlencode(query)}",
+        chunksize=chunksize,
+        usecols=["endpoint", "endpoint_end_date", *META_COLS, *DATE_COLS],
+        dtype=HISTORIC_DTYPES,
+    )
+    for chunk in chunks:
+        chunk = chunk[chunk["endpoint_end_date"].isna()].drop(columns="endpoint_end_date")
+        for col in DATE_COLS:
+            chunk[col] = pd.to_datetime(chunk[col], format="ISO8601")
+        yield chunk
+
+def summarise_chunk(chunk):
+    """
+    Builds the per-endpoint partial aggregates of one chunk.
+
+    Returns:
+        pd.DataFrame: Indexed by endpoint, with the COMBINE_AGG columns.
+    """
+    chunk = chunk.assign(
+        single_day_resources=chunk["resource_start_date"] == chunk["resource_end_date"],
+    )
+    return chunk.groupby("endpoint", sort=False).agg(
+        resource_count=("resource_start_date", "size"),
+        first_resource_start_date=("resource_start_date", "min"),
+        last_resource_start_date=("resource_start_date", "max"),
+        last_resource_end_date=("resource_end_date", "max"),
+        single_day_resources=("single_day_resources", "sum"),
+        **{col: (col, "first") for col in META_COLS},
+    )
+
+def recent_day_counts(chunk, since):
+    """
+    Counts the resources of one chunk started on each day since a date.
+
+    Returns:
+        pd.DataFrame: endpoint, day and resources columns.
+    """
+    start = chunk["resource_start_date"]
+    recent = chunk.loc[start >= pd.Timestamp(since), ["endpoint"]].assign(day=start.dt.normalize())
+    return recent.groupby(["endpoint", "day"], sort=False).size().reset_index(name="resources")
+
+def combine(running, partial):
+    """Folds a chunk's partial aggregates into the running totals."""
+    if running is None:
+        return partial
+    return pd.concat([running, partial]).groupby(level=0, sort=False).agg(COMBINE_AGG)
+
+def aggregate_history(chunks, since):
+    """
+    Aggregates streamed history chunks per endpoint.
+
+    Args:
+        chunks (iterable): DataFrames from iter_historic_endpoints.
+        since (date): First day whose resources are counted per day.
+
+    Returns:
+        tuple: (aggregates indexed by endpoint, daily counts since `since`).
+    """
+    aggregates = None
+    recent = []
+    rows = 0
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        rows += len(chunk)
+        aggregates = combine(aggregates, summarise_chunk(chunk))
+        recent.append(recent_day_counts(chunk, since))
+    print(f"Aggregated {rows} live-endpoint resource rows")
+
+    if aggregates is None:
+        empty = pd.DataFrame(columns=["endpoint", *META_COLS, *DATE_COLS]).astype({c: "datetime64[ns]" for c in DATE_COLS})
+        aggregates = summarise_chunk(empty)
+        recent.append(recent_day_counts(empty, since))
+    recent_days = pd.concat(recent).groupby(["endpoint", "day"], as_index=False)["resources"].sum()
+    return aggregates, recent_days
+
+# Incremental state
+def load_state(today):
+    """
+    Loads the per-endpoint state saved by the previous run.
+
+    Returns:
+        dict | None: The state, or None when a full reload is due.
+    """
+    try:
+        with open(STATE_PATH, "rb") as f:
+            state = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+        print(f"[WARNING] Could not read runaway state, reloading full history: {e}")
+        return None
+
+    if state.get("version") != STATE_VERSION or state.get("watermark") is None:
+        return None
+    if (today - state["full_refresh_at"]).days >= FULL_REFRESH_DAYS:
+        print(f"[INFO] Runaway state last rebuilt on {state['full_refresh_at']}, reloading full history")
+        return None
+    return state
+
+def save_state(aggregates, recent_days, full_refresh_at, today):
+    """
+    Saves the per-endpoint state, with a watermark of the latest resource
+    date seen (capped at today).
+    """
+    latest = pd.concat([aggregates["last_resource_start_date"], aggregates["last_resource_end_date"]]).max()
+    watermark = None if pd.isna(latest) else min(latest.date(), today)
+    state = {
+        "version": STATE_VERSION,
+        "watermark": watermark,
+        "full_refresh_at": full_refresh_at,
+        "aggregates": aggregates,
+        "recent_days": recent_days,
+    }
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        tmp_path = f"{STATE_PATH}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, STATE_PATH)
+    except OSError as e:
+        print(f"[WARNING] Could not write runaway state: {e}")
+
+def changed_endpoints(watermark):
+    """
+    Lists the endpoints with a row started, ended or entered on or after the
+    watermark. Rows of the watermark day itself are fetched again, which is
+    safe because changed endpoints are re-aggregated from scratch.
+
+    Returns:
+        list: Endpoint hashes.
+    """
+    since = watermark.isoformat()
+    sql = f"""
+        SELECT DISTINCT endpoint FROM {HISTORIC_TABLE}
+        WHERE resource_start_date >= '{since}'
+           OR resource_end_date >= '{since}'
+           OR endpoint_end_date >= '{since}'
+           OR endpoint_entry_date >= '{since}'
+    """
+    pages = iter_datasette_keyset_pages("digital-land", sql, keys=("endpoint",), strict=True)
+    return [endpoint for page in pages for endpoint in page["endpoint"]]
+
+def load_delta(state, since):
+    """
+    Updates the saved state with the endpoints changed since its watermark.
+
+    Returns:
+        tuple | None: (aggregates, recent_days), or None when so many
+        endpoints changed that a full reload is cheaper.
+    """
+    endpoints = changed_endpoints(state["watermark"])
+    print(f"[INFO] {len(endpoints)} endpoint(s) changed since {state['watermark']}")
+    if len(endpoints) > DELTA_MAX_ENDPOINTS:
+        return None
+
+    batches = [endpoints[i:i + DELTA_BATCH_SIZE] for i in range(0, len(endpoints), DELTA_BATCH_SIZE)]
+    chunks = (chunk for batch in batches for chunk in iter_historic_endpoints(batch))
+    changed, changed_days = aggregate_history(chunks, since)
+
+    # Changed endpoints are replaced wholesale; ended ones simply drop out
+    kept = state["aggregates"][~state["aggregates"].index.isin(endpoints)]
+    kept_days = state["recent_days"][~state["recent_days"]["endpoint"].isin(endpoints)]
+    aggregates = pd.concat([kept, changed])
+    recent_days = pd.concat([kept_days, changed_days], ignore_index=True)
+    return aggregates, recent_days[recent_days["day"] >= pd.Timestamp(since)]
+
+def flag_endpoints(aggregates, today):
+    """
+    Computes every runaway flag as a column in one vectorised pass over the
+    per-endpoint aggregates.
+
+    Args:
+        aggregates (pd.DataFrame): Per-endpoint aggregates, indexed by endpoint,
+            including days_active_7 (distinct start days in the last 7 days)
+            and resource_count_30.
+        today (date): Reference date for the flag windows.
+
+    Returns:
+        pd.DataFrame: "yes"/"no" flag columns, indexed by endpoint.
+    """
+    stale_cutoff = pd.Timestamp(today - timedelta(days=30))
+    flags = {
+        # A new resource on each of the last 7 days
+        "daily_for_7_days": aggregates["days_active_7"] >= 7,
+        # More than 20 new resources in last 30 days
+        ">20_instances_in_30_day_period": aggregates["resource_count_30"] > 20,
+        # Latest resource end date older than 30 days
+        "stale_resource": aggregates["last_resource_end_date"] < stale_cutoff,
+    }
+    return pd.DataFrame(
+        {name: np.where(flag, "yes", "no") for name, flag in flags.items()},
+        index=aggregates.index,
+    )
+
+def build_summary(aggregates, recent_days, today):
+    """
+    Builds the runaway resources report from the per-endpoint aggregates.
+
+    Args:
+        aggregates (pd.DataFrame): Per-endpoint aggregates, indexed by endpoint.
+        recent_days (pd.DataFrame): Resources started per endpoint and day.
+        today (date): Reference date for the flag windows.
+
+    Returns:
+        pd.DataFrame: One row per endpoint with more than one resource.
+    """
+    aggregates = aggregates.sort_index()
+    aggregates.index.name = "endpoint"
+
+    # Windowed counts from the daily counts (one row per endpoint and day)
+    day = recent_days["day"]
+    in_30 = recent_days[day >= pd.Timestamp(today - timedelta(days=30))]
+    in_7 = recent_days[(day >= pd.Timestamp(today - timedelta(days=7))) & (day < pd.Timestamp(today))]
+    aggregates = aggregates.assign(
+        resource_count_30=in_30.groupby("endpoint")["resources"].sum().reindex(aggregates.index, fill_value=0),
+        days_active_7=in_7["endpoint"].value_counts().reindex(aggregates.index, fill_value=0),
+    )
 
     # Build summary dataframe
     summary_df = (
-        df.groupby("endpoint")
-        .size()
-        .reset_index(name="resource_count")
+        aggregates[["resource_count"]]
+        .reset_index()
         .query("resource_count > 1")
         .sort_values("resource_count", ascending=False)
         .reset_index(drop=True)
     )
 
     # Add metadata columns
-    meta_cols = ["organisation_name", "dataset", "collection", "pipeline", "endpoint_entry_date"]
-    metadata = df.groupby("endpoint")[meta_cols].first().reset_index()
+    metadata = aggregates[META_COLS].astype(object).reset_index()
     summary_df = summary_df.merge(metadata, on="endpoint", how="left")
 
-    # First and last start dates
-    first_dates = df.groupby("endpoint")["resource_start_date"].min().dt.date
-    last_dates = df.groupby("endpoint")["resource_start_date"].max().dt.date
-
-    # Count single-day resources (same start and end date)
-    single_day_counts = df[df["resource_start_date"] == df["resource_end_date"]]
-    single_day_summary = single_day_counts.groupby("endpoint").size()
-
     # Insert derived columns
-    summary_df.insert(1, "first_resource_start_date", summary_df["endpoint"].map(first_dates))
-    summary_df.insert(2, "last_resource_start_date", summary_df["endpoint"].map(last_dates))
-    summary_df.insert(9, "single_day_resources", summary_df["endpoint"].map(single_day_summary).fillna(0).astype(int))
+    derived = aggregates.loc[summary_df["endpoint"]]
+    summary_df.insert(1, "first_resource_start_date", derived["first_resource_start_date"].dt.date.to_numpy())
+    summary_df.insert(2, "last_resource_start_date", derived["last_resource_start_date"].dt.date.to_numpy())
+    summary_df.insert(9, "single_day_resources", derived["single_day_resources"].astype(int).to_numpy())
 
     # Flagging logic
-    today = datetime.today().date()
-    recent_7_days = today - timedelta(days=7)
-    recent_30_days = today - timedelta(days=30)
-
-    # Daily streak for last 7 days
-    seven_day_df = df[df["resource_start_date"].dt.date >= recent_7_days]
-    start_dates_7 = seven_day_df.groupby("endpoint")["resource_start_date"].apply(lambda x: set(x.dt.date))
-    expected_last_7 = set(today - timedelta(days=i) for i in range(1, 8))
+    return summary_df.join(flag_endpoints(aggregates, today), on="endpoint")
 
-    summary_df["daily_for_7_days"] = summary_df["endpoint"].apply(
-        lambda ep: "yes" if expected_last_7.issubset(start_dates_7.get(ep, set())) else "no"
-    )
+def main(output_dir, full_refresh=False):
+    today = datetime.today().date()
+    since = today - timedelta(days=RECENT_DAYS)
 
-    # More than 20 new resources in last 30 days
-    thirty_day_df = df[df["resource_start_date"].dt.date >= recent_30_days]
-    resource_count_30 = thirty_day_df.groupby("endpoint").size()
+    # Update the saved state with the delta since the last run where possible
+    state = None if full_refresh else load_state(today)
+    history = None
+    full_refresh_at = today
+    if state is not None:
+        try:
+            history = load_delta(state, since)
+            full_refresh_at = state["full_refresh_at"]
+        except Exception as e:
+            print(f"[WARNING] Incremental update failed, reloading full history: {e}")
+    if history is None:
+        history = aggregate_history(iter_historic_endpoints(), since)
+        full_refresh_at = today
 
-    summary_df[">20_instances_in_30_day_period"] = summary_df["endpoint"].apply(
-        lambda ep: "yes" if resource_count_30.get(ep, 0) > 20 else "no"
-    )
-
-    # Flag endpoints with stale resource end dates
-    last_end_dates = df.groupby("endpoint")["resource_end_date"].max().dt.date
-    stale_cutoff = today - timedelta(days=30)
-
-    summary_df["stale_resource"] = summary_df["endpoint"].apply(
-        lambda ep: "yes" if pd.notnull(last_end_dates.get(ep)) and last_end_dates.get(ep) < stale_cutoff else "no"
-    )
+    aggregates, recent_days = history
+    save_state(aggregates, recent_days, full_refresh_at, today)
+    summary_df = build_summary(aggregates, recent_days, today)
 
     # Output
     csv_name = "runaway_resources.csv"
     save_path = os.path.join(output_dir, csv_name)
-    summary_df.to_csv(save_path, index=False)  # Save to CSV without index
-    print(f"Saved: {save_path}")
+    for path in write_output(summary_df, save_path):
+        print(f"Saved: {path}")
 
 def parse_args():
     """
@@ -94,10 +346,16 @@ def parse_args():
         required=True,
         help="Directory to save exported CSVs"
     )
+    parser.add_argument(
+        "--full-refresh",
+        action="store_true",
+        help="Ignore the saved state and aggregate the full history"
+    )
+    add_format_argument(parser)
     return parser.parse_args()
 
 if __name__ == "__main__":
     # Parse command-line arguments
     args = parse_args()
-    main(args.output_dir)
-
+    set_output_format(args.format)
+    main(args.output_dir, full_refresh=args.full_refresh)
@@ -0,0 +1,85 @@
+"""
+Regression test for the field_errors column of odp-conformance.csv: the
+grouped count must match the per-row issue scan it replaced.
+
+Run from monitoring_data_collection_tool_github_actions:
+    python -m pytest tests
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+from generate_odp_conformance_csv import count_field_errors
+
+
+def per_row_field_errors(column_field_df, issue_df):
+    """The original per-row scan (before the grouped count)."""
+    results_issues = [
+        issue_df[
+            (issue_df["resource"] == r["resource"]) & (issue_df["severity"] == "error")
+        ]
+        for index, r in column_field_df.iterrows()
+    ]
+    results_issues_df = pd.concat(results_issues)
+
+    return column_field_df.apply(
+        lambda row: len(
+            results_issues_df[row["resource"] == results_issues_df["resource"]]
+        ),
+        axis=1,
+    )
+
+
+def make_frames(seed, n_rows=60, n_resources=15, n_issues=200):
+    """Synthetic column field and issue frames; resources repeat across rows."""
+    rng = np.random.default_rng(seed)
+    resources = [f"res-{i}" for i in range(n_resources)]
+    column_field_df = pd.DataFrame({
+        "organisation": rng.choice(["org-a", "org-b", "org-c"], n_rows),
+        "dataset": rng.choice(["article-4-direction", "tree", "conservation-area"], n_rows),
+        "resource": rng.choice(resources, n_rows),
+    })
+    issue_df = pd.DataFrame({
+        # Includes resources with no rows in column_field_df
+        "resource": rng.choice(resources + ["res-orphan"], n_issues),
+        "severity": rng.choice(["error", "warning", "info"], n_issues),
+        "field": rng.choice(["name", "geometry", "reference"], n_issues),
+    })
+    return column_field_df, issue_df
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_per_row_scan(seed):
+    column_field_df, issue_df = make_frames(seed)
+    assert column_field_df["resource"].duplicated().any()
+
+    expected = per_row_field_errors(column_field_df, issue_df)
+    pd.testing.assert_series_equal(
+        count_field_errors(column_field_df, issue_df), expected, check_names=False, check_dtype=False
+    )
+
+
+def test_resource_on_several_rows():
+    column_field_df = pd.DataFrame({"resource": ["r1", "r1", "r1", "r2", "r3"]})
+    issue_df = pd.DataFrame({
+        "resource": ["r1", "r1", "r2", "r2", "r3", "r4"],
+        "severity": ["error", "error", "error", "warning", "warning", "error"],
+    })
+
+    # r1: 2 errors x 3 rows; r2: 1 error x 1 row; r3: warnings only
+    assert count_field_errors(column_field_df, issue_df).tolist() == [6, 6, 6, 1, 0]
+    assert per_row_field_errors(column_field_df, issue_df).tolist() == [6, 6, 6, 1, 0]
+
+
+def test_no_error_issues():
+    column_field_df, issue_df = make_frames(0)
+    issue_df["severity"] = "warning"
+
+    field_errors = count_field_errors(column_field_df, issue_df)
+    assert field_errors.tolist() == [0] * len(column_field_df)
+    assert field_errors.dtype == int
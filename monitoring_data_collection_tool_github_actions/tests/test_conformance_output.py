@@ -0,0 +1,101 @@
+"""
+Regression test for odp-conformance.csv: runs generate_odp_conformance_csv
+end to end on fixture tables and compares the written CSV with the output of
+the implementation before the grouped field error count (the per-row issue
+scan), saved as fixtures/conformance/expected/odp-conformance.csv.
+
+The Datasette queries are answered by an in-memory SQLite copy of the
+fixture tables, so the real SQL (joins, COALESCE rowid keys), the parallel
+keyset paging, the merges and the CSV writer all run. Pages are kept small so
+every query spans several windows and pages.
+
+Run from monitoring_data_collection_tool_github_actions:
+    python -m pytest tests
+"""
+
+import os
+import sys
+import sqlite3
+import functools
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import _datasette
+import generate_odp_conformance_csv
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "conformance")
+EXPECTED_PATH = os.path.join(FIXTURE_DIR, "expected", "odp-conformance.csv")
+PAGE_SIZE = 25
+
+DATABASES = {
+    "digital-land": ["provision", "cohort", "organisation"],
+    "performance": [
+        "endpoint_dataset_resource_summary",
+        "reporting_latest_endpoints",
+        "endpoint_dataset_summary",
+        "endpoint_dataset_issue_type_summary",
+    ],
+}
+
+
+def load_databases() -> dict:
+    """Returns db name -> in-memory SQLite connection holding its fixture tables."""
+    connections = {}
+    for db, tables in DATABASES.items():
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        for table in tables:
+            df = pd.read_csv(os.path.join(FIXTURE_DIR, f"{table}.csv"), dtype=str, keep_default_na=False)
+            df.to_sql(table, conn, index=False)
+        connections[db] = conn
+    return connections
+
+
+@pytest.fixture
+def fake_datasette(monkeypatch):
+    """Answers Datasette queries from the fixture tables, with small pages."""
+    connections = load_databases()
+
+    def query_rows(db, sql):
+        cursor = connections[db].execute(sql)
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def get_datasette_json(db, sql, params=None, url=None):
+        return query_rows(db, sql)
+
+    def get_datasette_query(db, sql, filter=None, url=None):
+        return pd.DataFrame.from_dict(query_rows(db, sql))
+
+    monkeypatch.setattr(_datasette, "get_datasette_json", get_datasette_json)
+    monkeypatch.setattr(_datasette, "get_datasette_query", get_datasette_query)
+    monkeypatch.setattr(generate_odp_conformance_csv, "get_datasette_query", get_datasette_query)
+    monkeypatch.setattr(
+        generate_odp_conformance_csv,
+        "get_datasette_parallel_query",
+        functools.partial(_datasette.get_datasette_parallel_query, page_size=PAGE_SIZE),
+    )
+    spec = pd.read_csv(os.path.join(FIXTURE_DIR, "specification.csv"))
+    monkeypatch.setattr(generate_odp_conformance_csv, "get_dataset_field", lambda: spec.copy())
+    yield
+    for conn in connections.values():
+        conn.close()
+
+
+def test_output_matches_baseline(fake_datasette, tmp_path):
+    generate_odp_conformance_csv.main(str(tmp_path))
+
+    with open(tmp_path / "odp-conformance.csv", "r", encoding="utf-8") as f:
+        written = f.read()
+    with open(EXPECTED_PATH, "r", encoding="utf-8") as f:
+        expected = f.read()
+    assert written == expected
+
+
+def test_fixture_has_resources_on_several_rows(fake_datasette):
+    column_field_df = generate_odp_conformance_csv.get_column_field_summary("edrs.pipeline != ''")
+
+    assert len(column_field_df) > 2 * PAGE_SIZE
+    assert column_field_df["resource"].duplicated().any()
+    assert not {"edrs_rowid", "rle_rowid", "eds_rowid"} & set(column_field_df.columns)
@@ -0,0 +1,52 @@
+"""
+Tests that a spent probe time budget starts no new probes.
+
+Run from monitoring_data_collection_tool_github_actions:
+    python -m pytest tests
+"""
+
+import os
+import sys
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import flagged_failed_resources
+from _probe import run_probes
+
+
+def test_run_probes_zero_budget_makes_no_calls():
+    calls = []
+    urls = [f"http://host{i % 3}.example/{i}" for i in range(40)]
+
+    results = run_probes(urls, calls.append, default="skipped", time_budget=0)
+
+    assert calls == []
+    assert results == ["skipped"] * len(urls)
+
+
+def test_run_probes_within_budget_probes_every_url():
+    urls = [f"http://host{i % 3}.example/{i}" for i in range(40)]
+
+    assert run_probes(urls, str.upper, time_budget=60) == [url.upper() for url in urls]
+
+
+def test_classify_zero_budget_skips_probing(monkeypatch):
+    calls = []
+    monkeypatch.setattr(flagged_failed_resources, "probe_url", lambda url: calls.append(url))
+    df = pd.DataFrame({"endpoint_url": [
+        "https://example.gov.uk/wfs?request=GetFeature",
+        "https://example.gov.uk/plan.pdf",
+        "https://other.gov.uk/api",
+        "https://other.gov.uk/api",
+    ]})
+
+    classified = flagged_failed_resources.classify_failed_resources(df, time_budget=0)
+
+    assert calls == []
+    assert classified == [
+        flagged_failed_resources.PROBE_SKIPPED,
+        ("active document links", "pdf file in URL"),
+        flagged_failed_resources.PROBE_SKIPPED,
+        flagged_failed_resources.PROBE_SKIPPED,
+    ]